@@ -3,7 +3,11 @@
 import asyncio
 import yaml
 from core.loop import AgentLoop
-from core.session import MultiMCP
+from core.session import MultiMCP, server_root
+from modules.answer_cache import SemanticAnswerCache
+from modules.tools import ToolIndex
+from modules.model_manager import close_clients, get_llm_cache
+from modules.usage import usage_ledger
 
 def log(stage: str, msg: str):
     """Simple timestamped console logger."""
@@ -12,32 +16,92 @@ def log(stage: str, msg: str):
     print(f"[{now}] [{stage}] {msg}")
 
 
+def load_profile(path: str = "config/profiles.yaml") -> dict:
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def build_multi_mcp(profile: dict) -> MultiMCP:
+    """MultiMCP configured from profiles.yaml (shared by agent.py, service.py and batch runs)."""
+    mcp_settings = profile.get("mcp", {})
+    retrieval = profile.get("tool_retrieval", {}) or {}
+    tool_index = ToolIndex(
+        embedding_url=profile["memory"]["embedding_url"],
+        model_name=profile["memory"]["embedding_model"],
+        top_k=retrieval.get("top_k", 5),
+    ) if retrieval.get("enabled") else None
+    return MultiMCP(
+        server_configs=profile.get("mcp_servers", []),
+        startup_timeout=mcp_settings.get("startup_timeout", 30.0),
+        catalog_path=mcp_settings.get("tool_catalog"),
+        cache_policies=profile.get("tool_cache"),
+        single_flight_exclude=mcp_settings.get("single_flight_exclude"),
+        max_concurrent_calls=mcp_settings.get("max_concurrent_calls", 4),
+        supervisor_settings=mcp_settings.get("supervisor"),
+        warm_pool_settings=mcp_settings.get("warm_pool"),
+        tool_index=tool_index
+    )
+
+
+def build_answer_cache(profile: dict):
+    """SemanticAnswerCache from profiles.yaml `answer_cache`, or None when disabled."""
+    settings = profile.get("answer_cache", {}) or {}
+    if not settings.get("enabled"):
+        return None
+    owner_id = settings.get("invalidate_server", "documents")
+    owner = next((c for c in profile.get("mcp_servers", []) if c.get("id") == owner_id), None)
+    return SemanticAnswerCache(
+        embedding_url=profile["memory"]["embedding_url"],
+        model_name=profile["memory"]["embedding_model"],
+        threshold=settings.get("threshold", 0.92),
+        max_entries=settings.get("max_entries", 1000),
+        invalidate_on=settings.get("invalidate_on"),
+        path=settings.get("path"),
+        invalidate_root=server_root(owner) if owner else None,
+        cacheable_tools=settings.get("cacheable_tools"),
+    )
+
+
 async def main():
     print("🧠 Cortex-R Agent Ready")
     user_input = input("🧑 What do you want to solve today? → ")
 
     # Load MCP server configs from profiles.yaml
-    with open("config/profiles.yaml", "r") as f:
-        profile = yaml.safe_load(f)
-        mcp_servers = profile.get("mcp_servers", [])
+    profile = load_profile()
+    mcp_settings = profile.get("mcp", {})
 
-    multi_mcp = MultiMCP(server_configs=mcp_servers)
+    multi_mcp = build_multi_mcp(profile)
     print("Agent before initialize")
     await multi_mcp.initialize()
 
+    answer_cache = build_answer_cache(profile)
     agent = AgentLoop(
         user_input=user_input,
-        dispatcher=multi_mcp  # now uses dynamic MultiMCP
+        dispatcher=multi_mcp,  # now uses dynamic MultiMCP
+        answer_cache=answer_cache
     )
 
     try:
         final_response = await agent.run()
         print("\n💡 Final Answer:\n", final_response.replace("FINAL_ANSWER:", "").strip())
+        if multi_mcp.result_cache:
+            log("cache", f"Tool result cache: {multi_mcp.cache_stats()}")
+        if answer_cache:
+            log("cache", f"Answer cache: {answer_cache.stats()}")
+        if get_llm_cache():
+            log("cache", f"LLM response cache: {get_llm_cache().stats()}")
 
     except Exception as e:
         log("fatal", f"Agent failed: {e}")
         raise
 
+    finally:
+        if mcp_settings.get("metrics_file"):
+            multi_mcp.dump_metrics(mcp_settings["metrics_file"])
+        await multi_mcp.shutdown()
+        await close_clients()
+        print(usage_ledger.report("Process total"))
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -49,4 +113,4 @@ if __name__ == "__main__":
 # What is the relationship between Gensol and Go-Auto?
 # which course are we teaching on Canvas LMS?
 # Summarize this page: https://theschoolof.ai/
-# What is the log value of the amount that Anmol singh paid for his DLF apartment via Capbridge? 
\ No newline at end of file
+# What is the log value of the amount that Anmol singh paid for his DLF apartment via Capbridge? 
\ No newline at end of file
@@ -0,0 +1,130 @@
+# batch.py → Offline batch runner
+# Role: Push a JSONL file of queries through the Cortex-R loop for regression and capacity runs.
+
+# Input:  one JSON object per line, {"query": "..."} with an optional "id"
+#         (queries/sample_queries.jsonl holds the sample questions from agent.py)
+# Output: one JSON object per query, streamed as each finishes:
+#         id, query, answer, error, seconds, steps, tool_calls
+# Summary: throughput and latency percentiles printed at the end
+
+# Usage: python batch.py queries/sample_queries.jsonl results.jsonl --parallel 4
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from agent import build_answer_cache, build_multi_mcp, load_profile, log
+from core.context import AgentProfile
+from core.loop import AgentLoop
+from core.session import MultiMCP
+from modules.answer_cache import SemanticAnswerCache
+from modules.model_manager import close_clients, get_llm_cache
+from modules.usage import usage_ledger
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", f"line-{line_no}")
+            queries.append(item)
+    return queries
+
+
+async def run_one(
+    item: Dict[str, Any],
+    multi_mcp: MultiMCP,
+    profile: AgentProfile,
+    timeout: float,
+    answer_cache: Optional[SemanticAnswerCache] = None,
+) -> Dict[str, Any]:
+    agent = AgentLoop(
+        user_input=item["query"],
+        dispatcher=multi_mcp,
+        profile=profile,
+        time_budget=timeout,
+        answer_cache=answer_cache,
+    )
+    record = {"id": item["id"], "query": item["query"], "answer": None, "error": None}
+    start = time.perf_counter()
+    try:
+        answer = await agent.run()
+        record["answer"] = answer.replace("FINAL_ANSWER:", "").strip()
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["steps"] = len(agent.context.stage_timings)
+    record["tool_calls"] = [{"tool": t.tool_name, "arguments": t.arguments} for t in agent.context.tool_calls]
+    return record
+
+
+async def run_batch(input_path: str, output_path: str, parallel: int, timeout: float):
+    profile_dict = load_profile()
+    queries = load_queries(input_path)
+    multi_mcp = build_multi_mcp(profile_dict)
+    await multi_mcp.initialize()
+    profile = AgentProfile()
+    answer_cache = build_answer_cache(profile_dict)
+    semaphore = asyncio.Semaphore(parallel)
+    latencies: List[float] = []
+    errors = 0
+
+    async def guarded(item):
+        async with semaphore:
+            return await run_one(item, multi_mcp, profile, timeout, answer_cache)
+
+    start = time.perf_counter()
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for finished in asyncio.as_completed([guarded(item) for item in queries]):
+                record = await finished
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                latencies.append(record["seconds"])
+                errors += record["error"] is not None
+                log("batch", f"{len(latencies)}/{len(queries)} {record['id']} in {record['seconds']}s")
+    finally:
+        await multi_mcp.shutdown()
+        await close_clients()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n📊 {len(latencies)} queries in {elapsed:.1f}s ({len(latencies) / elapsed if elapsed else 0:.2f} q/s), "
+          f"parallel={parallel}, errors={errors}")
+    print("   latency p50={:.2f}s p90={:.2f}s p95={:.2f}s p99={:.2f}s max={:.2f}s".format(
+        percentile(latencies, 50), percentile(latencies, 90), percentile(latencies, 95),
+        percentile(latencies, 99), max(latencies, default=0.0),
+    ))
+    if answer_cache:
+        print(f"   answer cache: {answer_cache.stats()}")
+    if get_llm_cache():
+        print(f"   llm cache: {get_llm_cache().stats()}")
+    print(usage_ledger.report("Batch total"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through the Cortex-R agent.")
+    parser.add_argument("input", help="JSONL file, one {\"query\": ...} per line")
+    parser.add_argument("output", help="JSONL file to stream results into")
+    parser.add_argument("--parallel", type=int, default=4, help="queries in flight at once")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds per query")
+    args = parser.parse_args()
+    asyncio.run(run_batch(args.input, args.output, args.parallel, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@
 
 from typing import List, Optional, Dict, Any
 from modules.memory import MemoryManager, MemoryItem
+from modules.usage import UsageLedger
 from pathlib import Path
 import yaml
 import time
@@ -38,6 +39,11 @@ class AgentProfile:
         self.description = config["agent"]["description"]
         self.strategy = config["strategy"]["type"]
         self.max_steps = config["strategy"]["max_steps"]
+        self.time_budget = config["strategy"].get("time_budget")  # seconds per session, None = unlimited
+        self.speculation = config.get("speculation", {}) or {}
+        self.perception_fast_path = config["strategy"].get("perception_fast_path", True)
+        self.explore_all = config["strategy"].get("explore_all", {}) or {}
+        self.cascade = config["strategy"].get("cascade", {}) or {}
 
         self.memory_config = config["memory"]
         self.llm_config = config["llm"]
@@ -53,9 +59,11 @@ class ToolCallTrace:
         self.result = result
 
 class AgentContext:
-    def __init__(self, user_input: str, profile: Optional[AgentProfile] = None):
+    def __init__(self, user_input: str, profile: Optional[AgentProfile] = None, time_budget: Optional[float] = None):
         self.user_input = user_input
         self.agent_profile = profile or AgentProfile()
+        budget = time_budget if time_budget is not None else self.agent_profile.time_budget
+        self.deadline: Optional[float] = time.monotonic() + budget if budget else None
         self.session_id = f"session-{int(time.time())}-{uuid.uuid4().hex[:6]}"
         self.step = 0
         self.memory = MemoryManager(
@@ -65,14 +73,26 @@ class AgentContext:
         self.memory_trace: List[MemoryItem] = []
         self.tool_calls: List[ToolCallTrace] = []
         self.final_answer: Optional[str] = None
+        self.stage_timings: List[Dict[str, float]] = []  # per step: stage → seconds
+        self.last_result: Optional[str] = None  # latest tool output, the fallback answer if time runs out
+        self.speculation_stats = {"hits": 0, "misses": 0}
+        self.perception_stats = {"llm": 0, "fast": 0}
+        self.cascade_stats = {"local": 0, "remote": 0}  # planning steps answered by each tier
+        self.llm_usage = UsageLedger()  # tokens / latency / cost of this session's LLM calls
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the session budget (None when there is no deadline)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
 
     def add_tool_trace(self, name: str, args: Dict[str, Any], result: Any):
         trace = ToolCallTrace(name, args, result)
         self.tool_calls.append(trace)
 
-    def add_memory(self, item: MemoryItem):
+    def add_memory(self, item: MemoryItem, timeout: Optional[float] = None):
         self.memory_trace.append(item)
-        self.memory.add(item)
+        self.memory.add(item, timeout=timeout)
 
     def __repr__(self):
         return f"<AgentContext step={self.step}, session_id={self.session_id}>"
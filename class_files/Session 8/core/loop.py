@@ -1,20 +1,56 @@
 # core/loop.py
 
 import asyncio
-from core.context import AgentContext
+import time
+from core.context import AgentContext, AgentProfile
 from core.session import MultiMCP
 from core.strategy import decide_next_action
 from modules.perception import extract_perception, PerceptionResult
 from modules.action import ToolCallResult, parse_function_call
 from modules.memory import MemoryItem
+from modules.answer_cache import SemanticAnswerCache
+from modules.usage import bind_session_usage, unbind_session_usage
+from core.metrics import tool_metrics
 import json
+import re
+from typing import Optional, Dict, Any
+
+# Question filler the planner strips when it rewrites the user's question into a search query
+QUERY_FILLER = {
+    "what", "whats", "s", "is", "are", "was", "were", "the", "a", "an", "of", "do", "does", "did",
+    "you", "know", "about", "tell", "me", "please", "can", "could", "find", "search", "for",
+    "and", "in", "on", "to", "with", "by",
+}
+
+
+def normalise_query(value: Any) -> Any:
+    """Compare speculative and planned string args by their content words, not their exact phrasing."""
+    if not isinstance(value, str):
+        return value
+    words = re.findall(r"[a-z0-9]+", value.lower())
+    return frozenset(w for w in words if w not in QUERY_FILLER)
+
+
+class BudgetExceeded(Exception):
+    """The session's time budget ran out while a stage was running."""
 
 
 class AgentLoop:
-    def __init__(self, user_input: str, dispatcher: MultiMCP):
-        self.context = AgentContext(user_input)
+    def __init__(
+        self,
+        user_input: str,
+        dispatcher: MultiMCP,
+        profile: Optional[AgentProfile] = None,
+        time_budget: Optional[float] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+    ):
+        self.context = AgentContext(user_input, profile=profile, time_budget=time_budget)
         self.mcp = dispatcher
+        self.answer_cache = answer_cache
         self.tools = dispatcher.get_all_tools()
+        self._speculation: Optional[Dict[str, Any]] = None  # {tool, arguments, match, task}
+        self._perception: Optional[PerceptionResult] = None  # last LLM perception, carried across steps
+        self._refresh_perception = True  # next step must ask the LLM (first step, failed or redirected plan)
 
     def tool_expects_input(self, tool_name: str) -> bool:
         tool = next((t for t in self.tools if getattr(t, "name", None) == tool_name), None)
@@ -23,11 +59,154 @@ class AgentLoop:
         parameters = getattr(tool, "parameters", {})
         return list(parameters.keys()) == ["input"]
 
-    
+    @staticmethod
+    async def _timed(stage: str, awaitable, timings: dict):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[stage] = round(time.perf_counter() - start, 3)
+
+    async def _stage(self, stage: str, awaitable, timings: dict):
+        """Run a stage with whatever is left of the session budget as its timeout."""
+        remaining = self.context.remaining()
+        if remaining is not None and remaining <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise BudgetExceeded(stage)
+        try:
+            return await self._timed(stage, asyncio.wait_for(awaitable, timeout=remaining), timings)
+        except Exception:
+            # wait_for timing out, or an HTTP timeout we passed the remaining budget to
+            if self.context.remaining() == 0:
+                raise BudgetExceeded(stage)
+            raise  # a genuine failure (or the stage's own timeout), not our deadline
+
+    def _start_speculation(self, perception: PerceptionResult):
+        """
+        Opt-in (profiles.yaml `speculation`): while the planner waits on the LLM, start
+        perception's tool_hint with the user's question as its single string argument.
+        Only side-effect free tools listed in the profile are ever speculated.
+        """
+        settings = self.context.agent_profile.speculation
+        policy = (settings.get("tools") or {}).get(perception.tool_hint) if settings.get("enabled") else None
+        if policy is None:
+            return
+        tool = next((t for t in self.tools if t.name == perception.tool_hint), None)
+        schema = getattr(tool, "inputSchema", None) or {}
+        required = schema.get("required", [])
+        if len(required) != 1 or schema.get("properties", {}).get(required[0], {}).get("type") != "string":
+            return  # we can only guess arguments for single-string tools
+
+        arguments = {required[0]: perception.user_input}
+        print(f"[speculation] Starting {tool.name}({arguments}) while planning")
+        self._speculation = {
+            "tool": tool.name,
+            "arguments": arguments,
+            "match": (policy or {}).get("match", "args"),
+            "task": asyncio.create_task(self.mcp.call_tool(tool.name, arguments)),
+        }
+
+    def _take_speculation(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the speculation if the plan agrees with it, otherwise discard it."""
+        spec, self._speculation = self._speculation, None
+        if spec is None:
+            return None
+        stats = self.context.speculation_stats
+        same_args = (
+            spec["arguments"].keys() == tool_input.keys()
+            and all(normalise_query(spec["arguments"][k]) == normalise_query(tool_input[k]) for k in tool_input)
+        )
+        if spec["tool"] == tool_name and (spec["match"] == "tool" or same_args):
+            stats["hits"] += 1
+            tool_metrics.inc("speculation_total", outcome="hit")
+            print(f"[speculation] ✅ Plan matches, reusing {tool_name} result")
+            return spec
+        stats["misses"] += 1
+        tool_metrics.inc("speculation_total", outcome="miss")
+        print(f"[speculation] ❌ Plan chose {tool_name}({tool_input}), discarding")
+        spec["task"].cancel()
+        return None
+
+    def _cancel_speculation(self):
+        if self._speculation:
+            self._speculation["task"].cancel()
+            self.context.speculation_stats["misses"] += 1
+            tool_metrics.inc("speculation_total", outcome="miss")
+            self._speculation = None
+
+    async def _carried_perception(self, query: str) -> PerceptionResult:
+        """
+        Follow-up steps: intent and entities do not change just because a tool ran, so reuse
+        the last LLM perception with the new loop prompt as input. The hint is dropped so the
+        planner sees every tool for whatever comes next.
+        """
+        return PerceptionResult(
+            user_input=query,
+            intent=self._perception.intent,
+            entities=self._perception.entities,
+            tool_hint=None,
+        )
+
+    def _report_timings(self):
+        for i, timings in enumerate(self.context.stage_timings, start=1):
+            stages = ", ".join(f"{stage} {secs}s" for stage, secs in timings.items())
+            print(f"[timing] Step {i}: {stages}")
+        stats = self.context.perception_stats
+        print(f"[timing] Perception: {stats['llm']} LLM call(s), {stats['fast']} fast-path step(s)")
+        spec = self.context.speculation_stats
+        if spec["hits"] + spec["misses"]:
+            print(f"[speculation] {spec['hits']} hit(s), {spec['misses']} miss(es) "
+                  f"({spec['hits'] / (spec['hits'] + spec['misses']):.0%} hit rate)")
+        cascade = self.context.cascade_stats
+        total = cascade["local"] + cascade["remote"]
+        if total:
+            print(f"[cascade] {cascade['local']}/{total} planning step(s) handled locally "
+                  f"({cascade['local'] / total:.0%})")
+
 
     async def run(self) -> str:
-        print(f"[agent] Starting session: {self.context.session_id}")
+        # every LLM call made on this task tree is also counted in context.llm_usage
+        usage_token = bind_session_usage(self.context.llm_usage)
+        try:
+            return await self._run()
+        finally:
+            unbind_session_usage(usage_token)
+            print(self.context.llm_usage.report(f"Session {self.context.session_id}"))
 
+    async def _run(self) -> str:
+        print(f"[agent] Starting session: {self.context.session_id}")
+        query = self.context.user_input
+
+        # 🗃️ Semantic answer cache: a near-duplicate question skips the whole pipeline.
+        # The query is embedded once here (bounded by the budget); store() reuses the vector.
+        query_vector = None
+        if self.answer_cache:
+            hit = None
+            try:
+                query_vector = await self._stage(
+                    "answer_cache", asyncio.to_thread(self.answer_cache.embed, query, timeout=self.context.remaining()), {}
+                )
+                hit = self.answer_cache.lookup(query, query_vector)
+            except Exception as e:  # incl. BudgetExceeded: _run_steps then returns its fallback answer
+                print(f"[answer-cache] ⚠️ Lookup failed: {e}")
+            if hit:
+                print(f"[answer-cache] Hit ({hit['similarity']}) for: {hit['query']}")
+                self.context.final_answer = hit["answer"]
+                return hit["answer"]
+
+        answer = await self._run_steps()
+
+        if self.answer_cache and self.context.final_answer and query_vector is not None:
+            try:
+                # no network on the return path: just the in-memory append + JSON save
+                tools_used = [call.tool_name for call in self.context.tool_calls]
+                await asyncio.to_thread(self.answer_cache.store, query, answer, query_vector, tools_used)
+            except Exception as e:
+                print(f"[answer-cache] ⚠️ Store failed: {e}")
+        return answer
+
+    async def _run_steps(self) -> str:
         try:
             max_steps = self.context.agent_profile.max_steps
             query = self.context.user_input
@@ -36,8 +215,38 @@ class AgentLoop:
                 self.context.step = step
                 print(f"[loop] Step {step + 1} of {max_steps}")
 
-                # 🧠 Perception
-                perception_raw = await extract_perception(query)
+                timings = {}
+                self.context.stage_timings.append(timings)
+
+                # 🧠 Perception: LLM on the first step or after a failed/redirected plan, else carried forward
+                fast_path = (
+                    self.context.agent_profile.perception_fast_path
+                    and not self._refresh_perception
+                    and self._perception is not None
+                )
+                if fast_path:
+                    perception_stage = ("perception_fast", self._carried_perception(query))
+                    self.context.perception_stats["fast"] += 1
+                else:
+                    perception_stage = ("perception", extract_perception(query))
+                    self.context.perception_stats["llm"] += 1
+
+                # 🧠 Perception + 💾 Memory Retrieval — both only need `query`, so run them together.
+                # retrieve() blocks on an HTTP embedding call, so it goes to a worker thread
+                # (listed first so the thread is already running when perception starts).
+                start = time.perf_counter()
+                retrieved, perception_raw = await asyncio.gather(
+                    self._stage("memory", asyncio.to_thread(
+                        self.context.memory.retrieve,
+                        query=query,
+                        top_k=self.context.agent_profile.memory_config["top_k"],
+                        type_filter=self.context.agent_profile.memory_config.get("type_filter", None),
+                        session_filter=self.context.session_id,
+                        timeout=self.context.remaining()
+                    ), timings),
+                    self._stage(*perception_stage, timings),
+                )
+                timings["perception+memory"] = round(time.perf_counter() - start, 3)
 
 
                 # ✅ Exit cleanly on FINAL_ANSWER
@@ -80,23 +289,24 @@ class AgentLoop:
                         break
 
                 print(f"[perception] Intent: {perception.intent}, Hint: {perception.tool_hint}")
+                if not fast_path:
+                    self._perception = perception
+                    self._refresh_perception = False
 
-                # 💾 Memory Retrieval
-                retrieved = self.context.memory.retrieve(
-                    query=query,
-                    top_k=self.context.agent_profile.memory_config["top_k"],
-                    type_filter=self.context.agent_profile.memory_config.get("type_filter", None),
-                    session_filter=self.context.session_id
-                )
                 print(f"[memory] Retrieved {len(retrieved)} memories")
 
+                # 🔮 Speculative tool call (first step only: later inputs are loop prompts, not questions)
+                if step == 0:
+                    self._start_speculation(perception)
+
                 # 📊 Planning (via strategy)
-                plan = await decide_next_action(
+                plan = await self._stage("plan", decide_next_action(
                     context=self.context,
                     perception=perception,
                     memory_items=retrieved,
-                    all_tools=self.tools
-                )
+                    all_tools=self.tools,
+                    tool_index=self.mcp.tool_index
+                ), timings)
                 print(f"[plan] {plan}")
 
                 if "FINAL_ANSWER:" in plan:
@@ -118,7 +328,13 @@ class AgentLoop:
                     else:
                         tool_input = arguments
 
-                    response = await self.mcp.call_tool(tool_name, tool_input)
+                    speculative = self._take_speculation(tool_name, tool_input)
+                    if speculative:
+                        if speculative["match"] == "tool":
+                            arguments = speculative["arguments"]  # opt-in loose match: record what actually ran
+                        response = await self._stage("tool", speculative["task"], timings)
+                    else:
+                        response = await self._stage("tool", self.mcp.call_tool(tool_name, tool_input), timings)
 
                     # ✅ Safe TextContent parsing
                     raw = getattr(response.content, 'text', str(response.content))
@@ -129,6 +345,13 @@ class AgentLoop:
 
                     result_str = result_obj.get("markdown") if isinstance(result_obj, dict) else str(result_obj)
                     print(f"[action] {tool_name} → {result_str}")
+                    self.context.last_result = result_str
+
+                    # Re-ask the perception LLM next step only if this step failed or went elsewhere
+                    failed = getattr(response, "isError", False) or "ERROR" in result_str[:60]
+                    redirected = bool(self._perception.tool_hint) and tool_name != self._perception.tool_hint
+                    self._refresh_perception = failed or redirected
+                    self.context.add_tool_trace(tool_name, arguments, result_str)
 
                     # 🧠 Add memory
                     memory_item = MemoryItem(
@@ -139,7 +362,9 @@ class AgentLoop:
                         tags=[tool_name],
                         session_id=self.context.session_id
                     )
-                    self.context.add_memory(memory_item)
+                    await self._stage("memory_add", asyncio.to_thread(
+                        self.context.add_memory, memory_item, timeout=self.context.remaining()
+                    ), timings)
 
                     # 🔁 Next query
                     query = f"""Original user task: {self.context.user_input}
@@ -152,13 +377,24 @@ class AgentLoop:
     FINAL_ANSWER: your answer
 
     Otherwise, return the next FUNCTION_CALL."""
+                except BudgetExceeded:
+                    raise
                 except Exception as e:
                     print(f"[error] Tool execution failed: {e}")
+                    self._refresh_perception = True
                     break
 
+        except BudgetExceeded as e:
+            # Out of time: answer with the best we have instead of nothing
+            print(f"[agent] ⏱️ Time budget exhausted during {e}")
+            if not self.context.final_answer and self.context.last_result:
+                self.context.final_answer = f"FINAL_ANSWER: [partial] {self.context.last_result}"
+
         except Exception as e:
             print(f"[agent] Session failed: {e}")
 
+        self._cancel_speculation()  # plan ended without using it (FINAL_ANSWER, parse error, ...)
+        self._report_timings()
         return self.context.final_answer or "FINAL_ANSWER: [no result]"
 
 
@@ -0,0 +1,114 @@
+# core/metrics.py → In-memory Tool Metrics
+# Role: Show where a slow step went: process start, MCP handshake, or the tool itself.
+
+# Responsibilities:
+
+# Histograms per server for connect / initialize, per tool for call / total wall time
+
+# Request and response payload sizes, error counters
+
+# Dump to JSON or a Prometheus text file
+
+# Used by: core/session.py (ServerConnection, ServerSupervisor), modules/usage.py (llm_* series)
+
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+BYTES_BUCKETS = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "buckets": {str(b): c for b, c in zip(self.buckets + ["+Inf"], self.counts)},
+        }
+
+
+class ToolMetrics:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = Histogram(BYTES_BUCKETS if name.endswith("_bytes") else SECONDS_BUCKETS)
+            self.histograms[key] = hist
+        hist.observe(value)
+
+    def inc(self, name: str, amount: int = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def to_json(self) -> Dict:
+        out: Dict[str, List[Dict]] = {}
+        for (name, labels), hist in sorted(self.histograms.items()):
+            out.setdefault(name, []).append({"labels": dict(labels), **hist.to_dict()})
+        for (name, labels), value in sorted(self.counters.items()):
+            out.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return out
+
+    def to_prometheus(self) -> str:
+        def fmt(labels: Labels, extra: str = "") -> str:
+            parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), hist in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(hist.buckets + ["+Inf"], hist.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{fmt(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{fmt(labels)} {hist.sum}")
+            lines.append(f"{name}_count{fmt(labels)} {hist.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write metrics to `path`: JSON for *.json, Prometheus text format otherwise."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.suffix == ".json":
+            target.write_text(json.dumps(self.to_json(), indent=2))
+        else:
+            target.write_text(self.to_prometheus())
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+
+# Process-wide instance shared by every MultiMCP / ServerConnection
+tool_metrics = ToolMetrics()
@@ -2,9 +2,21 @@
 
 import os
 import sys
-from typing import Optional, Any, List, Dict
+import asyncio
+import time
+import json
+import hashlib
+from pathlib import Path
+from typing import Optional, Any, List, Dict, Tuple
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from mcp.shared.exceptions import McpError
+from mcp.types import Tool, CallToolResult
+from core.tool_cache import ToolResultCache
+from core.metrics import tool_metrics
+from modules.cassette import get_cassette
+from modules.tools import ToolIndex
 
 
 class MCP:
@@ -47,61 +59,859 @@ class MCP:
                 return await session.call_tool(tool_name, arguments=arguments)
 
 
+def _server_id(config: dict) -> str:
+    """config["id"], falling back to the script (stdio) or url (sse) so either alone is enough."""
+    return config.get("id") or config.get("script") or config.get("url")
+
+
+def server_root(config: dict) -> Optional[str]:
+    """Directory a local (stdio) server runs from and writes its files to; None for network servers."""
+    if config.get("transport", "stdio") != "stdio" or not config.get("script"):
+        return None
+    return str((Path(config.get("cwd", os.getcwd())) / config["script"]).parent)
+
+
+def _server_location(config: dict) -> str:
+    if config.get("transport", "stdio") == "sse":
+        return config["url"]
+    return f"{config['script']} in {config.get('cwd', os.getcwd())}"
+
+
+class ServerConnection:
+    """
+    Long-lived MCP session for a single server config.
+    The transport and ClientSession are entered and exited inside one
+    owner task (anyio requires that), and the session is reused for every call.
+    If the server dies the next call reconnects transparently.
+
+    config["transport"] picks how we reach the server:
+    - stdio (default): spawn `script` as a private subprocess
+    - sse: connect to an already running shared server at config["url"]
+
+    standby=True marks a WarmPool copy: it is spawned with CORTEX_MCP_STANDBY=1 so servers
+    can skip one-off startup work (mcp_server_2.py's document indexer) that the primary already does.
+    """
+
+    def __init__(self, config: dict, standby: bool = False):
+        self.config = config
+        self.standby = standby
+        self.server_id = _server_id(config)
+        self.session: Optional[ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._error: Optional[BaseException] = None
+        self.inflight = 0
+        self.last_used = time.monotonic()
+        self.generation = 0  # bumps on every successful (re)connect: one process/session lifetime
+
+    def _params(self) -> StdioServerParameters:
+        return StdioServerParameters(
+            command=sys.executable,
+            args=[self.config["script"]],
+            cwd=self.config.get("cwd", os.getcwd()),
+            env={"CORTEX_MCP_STANDBY": "1"} if self.standby else None
+        )
+
+    def _transport(self):
+        if self.config.get("transport", "stdio") == "sse":
+            return sse_client(self.config["url"])
+        return stdio_client(self._params())
+
+    @property
+    def is_alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def _run(self):
+        try:
+            start = time.perf_counter()
+            async with self._transport() as (read, write):
+                tool_metrics.observe("mcp_server_connect_seconds", time.perf_counter() - start, server=self.server_id)
+                async with ClientSession(read, write) as session:
+                    start = time.perf_counter()
+                    await session.initialize()
+                    tool_metrics.observe("mcp_server_initialize_seconds", time.perf_counter() - start, server=self.server_id)
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            tool_metrics.inc("mcp_server_connect_errors_total", server=self.server_id)
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def connect(self) -> ClientSession:
+        async with self._lock:
+            if self.is_alive:
+                return self.session
+            await self._stop()
+            if self.config.get("transport", "stdio") == "sse":
+                print(f"→ Connecting to MCP server: {self.config['url']} ({self.server_id})")
+            else:
+                print(f"→ Starting MCP server: {self.config['script']} ({self.server_id})")
+            self._ready = asyncio.Event()
+            self._closing = asyncio.Event()
+            self._error = None
+            self._task = asyncio.create_task(self._run())
+            await self._ready.wait()
+            if self.session is None:
+                raise ConnectionError(f"Could not start MCP server '{self.server_id}': {self._error}")
+            self.generation += 1
+            return self.session
+
+    async def ping(self):
+        if not self.is_alive:
+            raise ConnectionError(f"MCP server '{self.server_id}' is not running")
+        await self.session.send_ping()
+
+    async def list_tools(self) -> List[Any]:
+        session = await self.connect()
+        result = await session.list_tools()
+        return result.tools
+
+    async def call_tool(self, tool_name: str, arguments: dict, retry: bool = True) -> Any:
+        """retry=False for side-effecting tools: a lost connection is raised, not re-run."""
+        self.inflight += 1
+        self.last_used = time.monotonic()
+        try:
+            return await self._call_tool(tool_name, arguments, retry)
+        finally:
+            self.inflight -= 1
+            self.last_used = time.monotonic()
+
+    async def _timed_call(self, session: ClientSession, tool_name: str, arguments: dict) -> Any:
+        start = time.perf_counter()
+        try:
+            return await session.call_tool(tool_name, arguments)
+        finally:
+            tool_metrics.observe(
+                "mcp_tool_call_seconds", time.perf_counter() - start, server=self.server_id, tool=tool_name
+            )
+
+    async def _call_tool(self, tool_name: str, arguments: dict, retry: bool = True) -> Any:
+        session = await self.connect()
+        try:
+            return await self._timed_call(session, tool_name, arguments)
+        except McpError:
+            raise  # server answered with an error, connection is fine
+        except Exception as e:
+            # Transport broke (server crashed/exited). Only tear down the session that failed:
+            # a concurrent caller may already have reconnected and be using the new one.
+            async with self._lock:
+                if self.session is session:
+                    await self._stop()
+            if not retry:
+                raise  # the tool may already have run; don't run it twice
+            print(f"⚠️ MCP server '{self.server_id}' connection lost ({e}), reconnecting...")
+            session = await self.connect()
+            return await self._timed_call(session, tool_name, arguments)
+
+    async def _stop(self):
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        except Exception:
+            pass
+        self._task = None
+        self.session = None
+
+    async def close(self):
+        async with self._lock:
+            await self._stop()
+
+
+class CircuitBreaker:
+    """
+    closed → calls flow; `failure_threshold` consecutive failures → open (fail fast);
+    after `cooldown` seconds → half_open (one trial call decides closed or open again;
+    everyone else keeps failing fast until that probe resolves).
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False  # a half_open trial call is in flight
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self.probing = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def recovered(self):
+        """
+        The server was restarted/replaced: an open circuit goes half_open right away (no need to
+        sit out the cooldown). Failure counts stay, so a tool that crashes every process still opens it.
+        """
+        if self.state == "open":
+            self.state = "half_open"
+            self.probing = False
+
+    def abandon_probe(self):
+        """The trial call was cancelled without an outcome; let the next caller probe."""
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class WarmPool:
+    """
+    Optional pool of pre-spawned, already-initialized standby processes per server.
+    - spikes: when the primary has `spill_after` calls in flight, extra calls go to the least busy standby
+    - crashes: the supervisor promotes a standby instead of cold-starting a replacement
+    - idle reaping: once a server sees no calls for `idle_timeout` seconds its standbys are closed;
+      the pool refills on the next call
+    Size is `size` per server, overridable via config["warm_standby"].
+    """
+
+    def __init__(self, size: int = 0, spill_after: int = 4, idle_timeout: float = 600.0, reap_interval: float = 60.0):
+        self.size = size
+        self.spill_after = spill_after
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.standbys: Dict[str, List[ServerConnection]] = {}  # server_id → ready connections
+        self._configs: Dict[str, dict] = {}
+        self._last_demand: Dict[str, float] = {}
+        self._filling: Dict[str, asyncio.Task] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def size_for(self, config: dict) -> int:
+        if config.get("transport", "stdio") != "stdio":
+            return 0  # shared network servers are not ours to spawn
+        return config.get("warm_standby", self.size)
+
+    def fill(self, config: dict):
+        """Top the server's standbys back up to its size in the background."""
+        server_id = _server_id(config)
+        self._configs[server_id] = config
+        self._last_demand[server_id] = time.monotonic()
+        ready = [c for c in self.standbys.get(server_id, []) if c.is_alive]
+        self.standbys[server_id] = ready
+        if len(ready) >= self.size_for(config):
+            return
+        task = self._filling.get(server_id)
+        if task is None or task.done():
+            self._filling[server_id] = asyncio.create_task(self._fill(server_id, config))
+        if self._reaper is None and self.idle_timeout:
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def _fill(self, server_id: str, config: dict):
+        while len(self.standbys[server_id]) < self.size_for(config):
+            conn = ServerConnection(config, standby=True)
+            try:
+                await conn.connect()
+            except Exception as e:
+                print(f"[pool] could not pre-spawn {server_id}: {e}")
+                return
+            self.standbys[server_id].append(conn)
+            print(f"[pool] {server_id}: {len(self.standbys[server_id])} warm standby ready")
+
+    def take(self, server_id: str) -> Optional[ServerConnection]:
+        """Remove a ready standby (for promotion to primary) and start refilling."""
+        ready = [c for c in self.standbys.get(server_id, []) if c.is_alive]
+        if not ready:
+            return None
+        conn = min(ready, key=lambda c: c.inflight)
+        self.standbys[server_id] = [c for c in ready if c is not conn]
+        self.fill(self._configs[server_id])
+        return conn
+
+    def overflow(self, server_id: str) -> Optional[ServerConnection]:
+        """A standby to absorb a load spike; it stays in the pool after the call."""
+        ready = [c for c in self.standbys.get(server_id, []) if c.is_alive and c.inflight < self.spill_after]
+        return min(ready, key=lambda c: c.inflight) if ready else None
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            now = time.monotonic()
+            for server_id, conns in list(self.standbys.items()):
+                last_demand = self._last_demand.get(server_id, 0.0)
+                idle = [
+                    c for c in conns
+                    if c.inflight == 0 and now - max(c.last_used, last_demand) > self.idle_timeout
+                ]
+                if idle:
+                    print(f"[pool] reaping {len(idle)} idle standby for {server_id}")
+                    self.standbys[server_id] = [c for c in conns if c not in idle]
+                    await asyncio.gather(*(c.close() for c in idle), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            server_id: {
+                "ready": sum(1 for c in conns if c.is_alive),
+                "busy": sum(c.inflight for c in conns),
+                "target": self.size_for(self._configs[server_id]),
+            }
+            for server_id, conns in self.standbys.items()
+        }
+
+    async def shutdown(self):
+        tasks = [t for t in [self._reaper, *self._filling.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._reaper = None
+        self._filling.clear()
+        await asyncio.gather(
+            *(c.close() for conns in self.standbys.values() for c in conns), return_exceptions=True
+        )
+        self.standbys.clear()
+
+
+class ServerSupervisor:
+    """
+    Owns the ServerConnections (and so the server subprocesses).
+    - pings running servers every `health_interval` seconds
+    - restarts dead servers with exponential backoff
+    - keeps a CircuitBreaker per server so callers fail fast instead of hanging
+    - reports state changes through status() and optional listeners
+    """
+
+    def __init__(
+        self,
+        health_interval: float = 15.0,
+        ping_timeout: float = 5.0,
+        call_timeout: float = 120.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_restart_attempts: int = 5,
+        pool: Optional[WarmPool] = None,
+    ):
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.call_timeout = call_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_restart_attempts = max_restart_attempts
+        self.pool = pool
+
+        self.connections: Dict[str, ServerConnection] = {}  # server_id → connection
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.restarts: Dict[str, int] = {}
+        self.last_error: Dict[str, Optional[str]] = {}
+        self.listeners: List[Any] = []  # callables(server_id, old_state, new_state)
+        self._restarting: Dict[str, asyncio.Task] = {}
+        self._outages: Dict[str, Tuple[int, int]] = {}  # server_id → (connection id, generation) last counted
+        self._monitor: Optional[asyncio.Task] = None
+
+    def connection(self, config: dict) -> ServerConnection:
+        server_id = _server_id(config)
+        conn = self.connections.get(server_id)
+        if conn is None:
+            conn = ServerConnection(config)
+            self.connections[server_id] = conn
+            self.breakers[server_id] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            self.restarts[server_id] = 0
+            self.last_error[server_id] = None
+        return conn
+
+    def _transition(self, server_id: str, old_state: str):
+        new_state = self.breakers[server_id].state
+        if new_state == old_state:
+            return
+        print(f"[supervisor] {server_id}: {old_state} → {new_state}")
+        for listener in self.listeners:
+            try:
+                listener(server_id, old_state, new_state)
+            except Exception as e:
+                print(f"[supervisor] listener failed: {e}")
+
+    def _record(self, server_id: str, error: Optional[BaseException] = None):
+        breaker = self.breakers[server_id]
+        old_state = breaker.state
+        if error is None:
+            breaker.record_success()
+        else:
+            self.last_error[server_id] = str(error) or type(error).__name__
+            breaker.record_failure()
+        self._transition(server_id, old_state)
+
+    def _record_outage(self, conn: ServerConnection, error: BaseException):
+        """
+        A transport failure counts once per server process: N callers on the same dead session,
+        plus the health check that notices it, are one outage for the breaker, not N + 1.
+        """
+        outage = (id(conn), conn.generation)
+        if self._outages.get(conn.server_id) == outage:
+            self.last_error[conn.server_id] = str(error) or type(error).__name__
+            return
+        self._outages[conn.server_id] = outage
+        self._record(conn.server_id, error)
+
+    def _recovered(self, server_id: str):
+        breaker = self.breakers[server_id]
+        old_state = breaker.state
+        breaker.recovered()
+        self._transition(server_id, old_state)
+
+    async def call(self, config: dict, tool_name: str, arguments: dict, retry: bool = True) -> Any:
+        conn = self.connection(config)
+        server_id = conn.server_id
+        breaker = self.breakers[server_id]
+        old_state = breaker.state
+        allowed = breaker.allow()
+        self._transition(server_id, old_state)
+        if not allowed:
+            raise ConnectionError(
+                f"MCP server '{server_id}' is unavailable (circuit {breaker.state}): {self.last_error[server_id]}"
+            )
+
+        if self.pool:
+            self.pool.fill(config)  # no-op when full; refills after reaping or promotion
+            if conn.inflight >= self.pool.spill_after:
+                conn = self.pool.overflow(server_id) or conn
+
+        labels = {"server": server_id, "tool": tool_name}
+        tool_metrics.observe("mcp_tool_request_bytes", len(json.dumps(arguments, default=str)), **labels)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(conn.call_tool(tool_name, arguments, retry), timeout=self.call_timeout)
+        except McpError:
+            tool_metrics.inc("mcp_tool_errors_total", **labels)
+            self._record(server_id)  # server is up, it just rejected the call
+            raise
+        except Exception as e:
+            tool_metrics.inc("mcp_tool_errors_total", **labels)
+            if isinstance(e, asyncio.TimeoutError):
+                e = TimeoutError(f"{tool_name} on '{server_id}' timed out after {self.call_timeout}s")
+            self._record_outage(conn, e)
+            self.schedule_restart(server_id)
+            raise e
+        except asyncio.CancelledError:
+            breaker.abandon_probe()
+            raise
+        finally:
+            # total = waiting for connect/initialize (cold or restarting server) + call
+            tool_metrics.observe("mcp_tool_total_seconds", time.perf_counter() - start, **labels)
+
+        if getattr(result, "isError", False):
+            tool_metrics.inc("mcp_tool_errors_total", **labels)
+        payload = result.model_dump_json() if hasattr(result, "model_dump_json") else str(result)
+        tool_metrics.observe("mcp_tool_response_bytes", len(payload), **labels)
+        self._record(server_id)
+        return result
+
+    def schedule_restart(self, server_id: str):
+        task = self._restarting.get(server_id)
+        if task is None or task.done():
+            self._restarting[server_id] = asyncio.create_task(self._restart(server_id))
+
+    async def _restart(self, server_id: str):
+        conn = self.connections[server_id]
+        if conn.is_alive:
+            # a caller may already have reconnected since the failure; don't close a healthy session
+            try:
+                await asyncio.wait_for(conn.ping(), timeout=self.ping_timeout)
+                self._recovered(server_id)
+                return
+            except Exception:
+                pass
+        standby = self.pool.take(server_id) if self.pool else None
+        if standby is not None:
+            # Promote a warm standby: no cold start on the crash path
+            self.connections[server_id] = standby
+            self.restarts[server_id] += 1
+            print(f"[supervisor] {server_id} replaced by warm standby")
+            self._recovered(server_id)
+            await conn.close()
+            return
+
+        await conn.close()
+        for attempt in range(self.max_restart_attempts):
+            delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+            await asyncio.sleep(delay)
+            try:
+                await conn.connect()
+            except Exception as e:
+                print(f"[supervisor] restart {attempt + 1}/{self.max_restart_attempts} of {server_id} failed: {e}")
+                self._record(server_id, e)
+                continue
+            self.restarts[server_id] += 1
+            print(f"[supervisor] {server_id} restarted (attempt {attempt + 1})")
+            self._recovered(server_id)
+            return
+        print(f"[supervisor] giving up on {server_id} after {self.max_restart_attempts} attempts")
+
+    async def _check(self, conn: ServerConnection):
+        try:
+            await asyncio.wait_for(conn.ping(), timeout=self.ping_timeout)
+        except Exception as e:
+            print(f"[supervisor] health check failed for {conn.server_id}: {str(e) or type(e).__name__}")
+            self._record_outage(conn, e)
+            self.schedule_restart(conn.server_id)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            # Only servers that are running (or were running) are checked; lazy servers stay cold.
+            running = [
+                conn for server_id, conn in self.connections.items()
+                if conn.is_alive and server_id not in self._restarting_now()
+            ]
+            await asyncio.gather(*(self._check(conn) for conn in running))
+
+    def _restarting_now(self) -> set:
+        return {sid for sid, task in self._restarting.items() if not task.done()}
+
+    def start(self):
+        if self._monitor is None and self.health_interval:
+            self._monitor = asyncio.create_task(self._health_loop())
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            server_id: {
+                "running": conn.is_alive,
+                "circuit": self.breakers[server_id].state,
+                "consecutive_failures": self.breakers[server_id].failures,
+                "restarts": self.restarts[server_id],
+                "restarting": server_id in self._restarting_now(),
+                "last_error": self.last_error[server_id],
+            }
+            for server_id, conn in self.connections.items()
+        }
+
+    async def shutdown(self):
+        tasks = [t for t in [self._monitor, *self._restarting.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._monitor = None
+        self._restarting.clear()
+        if self.pool:
+            await self.pool.shutdown()
+        await asyncio.gather(*(conn.close() for conn in self.connections.values()), return_exceptions=True)
+        self.connections.clear()
+
+
+class ToolCatalog:
+    """
+    On-disk cache of each server's tool list (name, description, input schema),
+    keyed by the server script's resolved path, mtime and md5, plus any files listed in
+    config["depends_on"] (e.g. models.py, where the input schemas live).
+    A stale fingerprint simply misses, so editing a server forces a fresh scan.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable tool catalog {self.path}: {e}")
+
+    @staticmethod
+    def fingerprint(config: dict) -> Optional[Dict[str, Any]]:
+        # network (sse) servers are not ours to fingerprint: no catalog entry, always scanned live
+        if config.get("transport", "stdio") != "stdio" or not config.get("script"):
+            return None
+        cwd = Path(config.get("cwd", os.getcwd()))
+        script = cwd / config["script"]
+        try:
+            fingerprint = {
+                "path": str(script.resolve()),
+                "mtime": script.stat().st_mtime,
+                "md5": hashlib.md5(script.read_bytes()).hexdigest(),
+            }
+            for name in config.get("depends_on", []):
+                dep = cwd / name
+                fingerprint[name] = {"mtime": dep.stat().st_mtime, "md5": hashlib.md5(dep.read_bytes()).hexdigest()}
+            return fingerprint
+        except OSError:
+            return None
+
+    def load(self, server_id: str, fingerprint: Optional[Dict[str, Any]]) -> Optional[List[Tool]]:
+        entry = self.entries.get(server_id)
+        if not entry or fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return None
+        return [Tool(**t) for t in entry["tools"]]
+
+    def store(self, server_id: str, fingerprint: Optional[Dict[str, Any]], tools: List[Tool]):
+        if fingerprint is None:
+            return
+        self.entries[server_id] = {
+            "fingerprint": fingerprint,
+            "tools": [t.model_dump(mode="json", exclude_none=True) for t in tools],
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.entries, indent=2))
+        except OSError as e:
+            print(f"⚠️ Could not save tool catalog {self.path}: {e}")
+
+
 class MultiMCP:
     """
-    Stateless version: discovers tools from multiple MCP servers, but reconnects per tool call.
-    Each call_tool() uses a fresh session based on tool-to-server mapping.
+    Discovers tools from multiple MCP servers and keeps one persistent session
+    per server. Each call_tool() is routed to the owning server's session, which
+    is reused across calls (and across AgentLoops sharing this MultiMCP).
+
+    With a tool catalog, servers whose script (and depends_on files) are unchanged are not
+    started at initialize(): tool_map comes from the catalog, the server starts on its first
+    call, and that call also revalidates the catalog against the live server in the background.
     """
 
-    def __init__(self, server_configs: List[dict]):
+    def __init__(
+        self,
+        server_configs: List[dict],
+        startup_timeout: float = 30.0,
+        catalog_path: Optional[str] = None,
+        cache_policies: Optional[Dict[str, Any]] = None,
+        single_flight_exclude: Optional[List[str]] = None,
+        max_concurrent_calls: int = 4,
+        supervisor_settings: Optional[Dict[str, Any]] = None,
+        warm_pool_settings: Optional[Dict[str, Any]] = None,
+        tool_index: Optional[ToolIndex] = None,
+    ):
         self.server_configs = server_configs
+        self.startup_timeout = startup_timeout  # per-server default, overridable via config["startup_timeout"]
+        self.catalog = ToolCatalog(catalog_path) if catalog_path else None
+        self._background: set = set()
+        self.result_cache = ToolResultCache(cache_policies, tool_root=self._tool_root) if cache_policies else None
+        self.tool_index = tool_index  # embedding index for tool retrieval, built after discovery
+        self.single_flight_exclude = set(single_flight_exclude or [])  # side-effecting tools run every time
+        self._inflight: Dict[str, asyncio.Task] = {}  # call key → upstream task shared by identical callers
+        self._pending_revalidation: Dict[str, Tuple[dict, Optional[Dict[str, Any]], List[Tool]]] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}  # upstream task → callers still awaiting it
+        self.single_flight_merged = 0
+        self.max_concurrent_calls = max_concurrent_calls  # per server, overridable via config["max_concurrent_calls"]
+        self._server_limits: Dict[str, asyncio.Semaphore] = {}
+        self.server_timings: Dict[str, Dict[str, Any]] = {}  # server_id → {status, seconds}
         self.tool_map: Dict[str, Dict[str, Any]] = {}  # tool_name → {config, tool}
+        self.pool = WarmPool(**warm_pool_settings) if warm_pool_settings else None
+        self.supervisor = ServerSupervisor(**(supervisor_settings or {}), pool=self.pool)
+        self.connections = self.supervisor.connections  # server_id → connection
+
+    def _connection_for(self, config: dict) -> ServerConnection:
+        return self.supervisor.connection(config)
+
+    def _register_tools(self, config: dict, tools: List[Any]):
+        for tool in tools:
+            self.tool_map[tool.name] = {
+                "config": config,
+                "tool": tool
+            }
+
+    async def _revalidate(self, config: dict, fingerprint: Optional[Dict[str, Any]], cached: List[Tool]):
+        """Background check that the cached catalog still matches the live server."""
+        server_id = _server_id(config)
+        timeout = config.get("startup_timeout", self.startup_timeout)
+        try:
+            tools = await asyncio.wait_for(self._connection_for(config).list_tools(), timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ Catalog revalidation for {server_id} failed: {e}")
+            return
+        live = [t.model_dump(mode="json", exclude_none=True) for t in tools]
+        if live != [t.model_dump(mode="json", exclude_none=True) for t in cached]:
+            print(f"[mcp] Tool catalog for {server_id} changed, refreshing")
+            for tool in cached:
+                self.tool_map.pop(tool.name, None)
+            self._register_tools(config, tools)
+            await self._build_tool_index()
+        self.catalog.store(server_id, fingerprint, tools)
+
+    async def _build_tool_index(self):
+        if not self.tool_index:
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.tool_index.build, self.get_all_tools())
+            print(f"[mcp] Tool index built for {len(self.tool_map)} tools in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Tool index unavailable, planning falls back to hint filtering: {e}")
+            self.tool_index = None
+
+    def _tool_root(self, tool_name: str) -> Optional[str]:
+        entry = self.tool_map.get(tool_name)
+        return server_root(entry["config"]) if entry else None
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _discover(self, config: dict):
+        server_id = _server_id(config)
+        timeout = config.get("startup_timeout", self.startup_timeout)
+        conn = self._connection_for(config)
+        start = time.perf_counter()
+
+        fingerprint = ToolCatalog.fingerprint(config) if self.catalog else None
+        cached = self.catalog.load(server_id, fingerprint) if self.catalog else None
+        if cached is not None:
+            # Served from the catalog: the server stays cold and is revalidated on its first call
+            self._register_tools(config, cached)
+            self._pending_revalidation[server_id] = (config, fingerprint, cached)
+            self.server_timings[server_id] = {
+                "status": "cached",
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            return
+
+        try:
+            print(f"→ Scanning tools from: {_server_location(config)}")
+            tools = await asyncio.wait_for(conn.list_tools(), timeout=timeout)
+            print(f"→ Tools received from {server_id}: {[tool.name for tool in tools]}")
+            self._register_tools(config, tools)
+            if self.catalog:
+                self.catalog.store(server_id, fingerprint, tools)
+            status = "ok"
+        except asyncio.TimeoutError:
+            print(f"❌ MCP server {server_id} did not respond within {timeout}s, skipping its tools")
+            await conn.close()
+            status = "timeout"
+        except Exception as e:
+            print(f"❌ Error initializing MCP server {server_id}: {e}")
+            await conn.close()
+            status = "error"
+        self.server_timings[server_id] = {
+            "status": status,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
 
     async def initialize(self):
+        """Discover all servers concurrently; a slow or broken server only loses its own tools."""
         print("in MultiMCP initialize")
-        for config in self.server_configs:
-            try:
-                params = StdioServerParameters(
-                    command=sys.executable,
-                    args=[config["script"]],
-                    cwd=config.get("cwd", os.getcwd())
-                )
-                print(f"→ Scanning tools from: {config['script']} in {params.cwd}")
-                async with stdio_client(params) as (read, write):
-                    print("Connection established, creating session...")
-                    try:
-                        async with ClientSession(read, write) as session:
-                            print("[agent] Session created, initializing...")
-                            await session.initialize()
-                            print("[agent] MCP session initialized")
-                            tools = await session.list_tools()
-                            print(f"→ Tools received: {[tool.name for tool in tools.tools]}")
-                            for tool in tools.tools:
-                                self.tool_map[tool.name] = {
-                                    "config": config,
-                                    "tool": tool
-                                }
-                    except Exception as se:
-                        print(f"❌ Session error: {se}")
-            except Exception as e:
-                print(f"❌ Error initializing MCP server {config['script']}: {e}")
+        cassette = get_cassette()
+        if cassette.replaying:
+            # Offline: tools come from the cassette, no server is started
+            configs = {_server_id(c): c for c in self.server_configs}
+            for item in cassette.tools:
+                config = configs.get(item["server"], {"id": item["server"], "script": item["server"]})
+                self._register_tools(config, [Tool(**item["tool"])])
+            await self._build_tool_index()
+            return
+
+        await asyncio.gather(*(self._discover(config) for config in self.server_configs))
+        for server_id, timing in self.server_timings.items():
+            print(f"[mcp] {server_id}: {timing['status']} in {timing['seconds']}s")
+        if cassette.recording:
+            cassette.tools = [
+                {"server": _server_id(e["config"]), "tool": e["tool"].model_dump(mode="json")}
+                for e in self.tool_map.values()
+            ]
+        await self._build_tool_index()
+        self.supervisor.start()
+        if self.pool:
+            for config in self.server_configs:
+                self.pool.fill(config)
 
     async def call_tool(self, tool_name: str, arguments: dict) -> Any:
         entry = self.tool_map.get(tool_name)
         if not entry:
             raise ValueError(f"Tool '{tool_name}' not found on any server.")
 
-        config = entry["config"]
-        params = StdioServerParameters(
-            command=sys.executable,
-            args=[config["script"]],
-            cwd=config.get("cwd", os.getcwd())
+        if self.result_cache:
+            cached = self.result_cache.get(tool_name, arguments)
+            if cached is not None:
+                print(f"[cache] hit: {tool_name}")
+                return cached
+
+        if tool_name in self.single_flight_exclude:
+            return await self._call_upstream(entry, tool_name, arguments)
+
+        # Single-flight: identical concurrent calls share one upstream request.
+        # The request runs in its own task so one caller being cancelled does not cancel the others;
+        # once the last waiter is cancelled (e.g. its session deadline hit) the request is cancelled too.
+        key = ToolResultCache.make_key(tool_name, arguments)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._call_upstream(entry, tool_name, arguments))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.single_flight_merged += 1
+            print(f"[mcp] joined in-flight call: {tool_name}")
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    async def call_tools(self, calls: List[Tuple[str, dict]]) -> List[Dict[str, Any]]:
+        """
+        Run independent tool calls concurrently.
+        Calls are grouped by owning server and each server gets at most
+        max_concurrent_calls in flight. Results come back in input order as
+        {"tool_name", "arguments", "result", "error"}; one failure does not affect the rest.
+        """
+        async def run_one(tool_name: str, arguments: dict) -> Dict[str, Any]:
+            outcome = {"tool_name": tool_name, "arguments": arguments, "result": None, "error": None}
+            entry = self.tool_map.get(tool_name)
+            if not entry:
+                outcome["error"] = f"Tool '{tool_name}' not found on any server."
+                return outcome
+            config = entry["config"]
+            server_id = _server_id(config)
+            limit = self._server_limits.get(server_id)
+            if limit is None:
+                limit = asyncio.Semaphore(config.get("max_concurrent_calls", self.max_concurrent_calls))
+                self._server_limits[server_id] = limit
+            try:
+                async with limit:
+                    outcome["result"] = await self.call_tool(tool_name, arguments)
+            except Exception as e:
+                outcome["error"] = str(e)
+            return outcome
+
+        return list(await asyncio.gather(*(run_one(name, args) for name, args in calls)))
+
+    async def _call_upstream(self, entry: Dict[str, Any], tool_name: str, arguments: dict) -> Any:
+        cassette = get_cassette()
+        key = cassette.key(tool_name, arguments) if cassette.mode != "off" else None
+        if cassette.replaying:
+            return CallToolResult.model_validate(cassette.replay("tool", key))
+
+        # side-effecting tools (single_flight_exclude) are never re-run after a lost connection
+        pending = self._pending_revalidation.pop(_server_id(entry["config"]), None)
+        if pending:
+            self._spawn(self._revalidate(*pending))  # the call below starts the server anyway
+        result = await self.supervisor.call(
+            entry["config"], tool_name, arguments, retry=tool_name not in self.single_flight_exclude
         )
+        if cassette.recording:
+            cassette.record("tool", key, result.model_dump(mode="json"))
+        if self.result_cache:
+            self.result_cache.put(tool_name, arguments, result)
+        return result
 
-        async with stdio_client(params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                return await session.call_tool(tool_name, arguments)
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.result_cache.stats() if self.result_cache else {}
 
     async def list_all_tools(self) -> List[str]:
         return list(self.tool_map.keys())
@@ -110,4 +920,19 @@ class MultiMCP:
         return [entry["tool"] for entry in self.tool_map.values()]
 
     async def shutdown(self):
-        pass  # no persistent sessions to close
\ No newline at end of file
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await self.supervisor.shutdown()
+        get_cassette().save()
+
+    def metrics(self) -> Dict[str, Any]:
+        return tool_metrics.to_json()
+
+    def dump_metrics(self, path: str):
+        """Write tool metrics to `path` (JSON for *.json, Prometheus text otherwise)."""
+        tool_metrics.dump(path)
+
+    def server_status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-server health: running, circuit state, failures, restarts, last error."""
+        return self.supervisor.status()
@@ -25,10 +25,13 @@
 
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
-from modules.tools import summarize_tools, filter_tools_by_hint
+from modules.tools import summarize_tools, select_tools, validate_arguments, ToolIndex
 from modules.decision import generate_plan
+from modules.action import parse_function_call
 from core.context import AgentContext
-from typing import Any
+from core.metrics import tool_metrics
+from typing import Any, Optional
+import asyncio
 
 
 async def decide_next_action(
@@ -37,6 +40,7 @@ async def decide_next_action(
     memory_items: list[MemoryItem],
     all_tools: list[Any],
     last_result: str = "",
+    tool_index: Optional[ToolIndex] = None,
 ) -> str:
     """
     Decides what to do next using the planning strategy defined in agent profile.
@@ -46,12 +50,29 @@ async def decide_next_action(
     strategy = context.agent_profile.strategy
     step = context.step + 1
     max_steps = context.agent_profile.max_steps
-    tool_hint = perception.tool_hint
 
-    # Step 1: Try hint-based filtered tools first
-    filtered_tools = filter_tools_by_hint(all_tools, hint=tool_hint)
+    if strategy == "explore_all":
+        return await explore_all(
+            context=context,
+            perception=perception,
+            memory_items=memory_items,
+            all_tools=all_tools,
+            tool_index=tool_index,
+        )
+
+    # Step 1: Try the most relevant tools first (embedding retrieval, or the hint filter)
+    filtered_tools = await select_tools(all_tools, perception, tool_index, timeout=context.remaining())
     filtered_summary = summarize_tools(filtered_tools)
 
+    if strategy == "cascade":
+        return await cascade(
+            context=context,
+            perception=perception,
+            memory_items=memory_items,
+            all_tools=all_tools,
+            tool_descriptions=filtered_summary,
+        )
+
     plan = await generate_plan(
         perception=perception,
         memory_items=memory_items,
@@ -67,7 +88,7 @@ async def decide_next_action(
     if strategy == "retry_once" and "unknown" in plan.lower():
         # Retry with all tools if hint-based filtering failed
         full_summary = summarize_tools(all_tools)
-        return generate_plan(
+        return await generate_plan(
             perception=perception,
             memory_items=memory_items,
             tool_descriptions=full_summary,
@@ -75,5 +96,168 @@ async def decide_next_action(
             max_steps=max_steps,
         )
 
-    # Placeholder for future "explore_all" parallel planner
     return plan
+
+
+def score_plan(plan: str, context: AgentContext, all_tools: list[Any]) -> float:
+    """
+    Cheap, LLM-free score for a candidate plan:
+    +1 known tool, +1 required args present, +1 not a repeat of an earlier call.
+    Once a tool has run, a real FINAL_ANSWER scores 3.5, so it never loses to "one more tool call";
+    before any tool result it scores 1.5, below a valid call (same rule as check_plan).
+    unknown/unparseable scores 0.
+    """
+    if plan.startswith("FINAL_ANSWER:"):
+        if "[unknown]" in plan:
+            return 0.0
+        return 3.5 if context.tool_calls else 1.5
+
+    try:
+        tool_name, args = parse_function_call(plan)
+    except Exception:
+        return 0.0
+    tool = next((t for t in all_tools if t.name == tool_name), None)
+    if tool is None:
+        return 0.0
+
+    score = 1.0
+    required = (getattr(tool, "inputSchema", None) or {}).get("required", [])
+    if all(key in args for key in required):
+        score += 1.0
+    if not any(t.tool_name == tool_name and t.arguments == args for t in context.tool_calls):
+        score += 1.0
+    return score
+
+
+def check_plan(plan: str, context: AgentContext, all_tools: list[Any], min_score: float) -> Optional[str]:
+    """
+    Gate for the cascade's local tier. Returns why the plan should be escalated, or None:
+    a FUNCTION_CALL must parse, name a known tool and carry schema-valid arguments,
+    a FINAL_ANSWER needs at least one tool result behind it (no answering from nothing),
+    and every plan must reach `min_score` under score_plan (low confidence otherwise).
+    """
+    if plan.startswith("FUNCTION_CALL:"):
+        try:
+            tool_name, args = parse_function_call(plan)
+        except Exception:
+            return "unparseable FUNCTION_CALL"
+        tool = next((t for t in all_tools if t.name == tool_name), None)
+        if tool is None:
+            return f"unknown tool {tool_name}"
+        problems = validate_arguments(args, getattr(tool, "inputSchema", None) or {})
+        if problems:
+            return f"invalid arguments: {'; '.join(problems)}"
+    elif plan.startswith("FINAL_ANSWER:"):
+        if not context.tool_calls:
+            return "FINAL_ANSWER before any tool result"
+    else:
+        return "no FUNCTION_CALL or FINAL_ANSWER"
+
+    score = score_plan(plan, context, all_tools)
+    if score < min_score:
+        return f"low confidence (score {score} < {min_score})"
+    return None
+
+
+async def cascade(
+    context: AgentContext,
+    perception: PerceptionResult,
+    memory_items: list[MemoryItem],
+    all_tools: list[Any],
+    tool_descriptions: str,
+) -> str:
+    """
+    Tiered planner: the local model (models.json key, e.g. phi4) plans first and its output
+    goes through check_plan; failures, timeouts and low-confidence plans escalate to the
+    remote model from `llm.text_generation`. Tier counts land in context.cascade_stats.
+    """
+    settings = context.agent_profile.cascade
+    local_model = settings.get("local_model", "phi4")
+    min_score = settings.get("min_score", 2.5)
+    step = context.step + 1
+    max_steps = context.agent_profile.max_steps
+
+    timeout = settings.get("local_timeout")
+    remaining = context.remaining()
+    if remaining is not None:
+        timeout = remaining if timeout is None else min(timeout, remaining)
+
+    try:
+        plan = await asyncio.wait_for(generate_plan(
+            perception=perception,
+            memory_items=memory_items,
+            tool_descriptions=tool_descriptions,
+            step_num=step,
+            max_steps=max_steps,
+            model_key=local_model,
+        ), timeout=timeout)
+        problem = check_plan(plan, context, all_tools, min_score)
+    except asyncio.TimeoutError:
+        problem = f"timed out after {timeout:.1f}s"
+
+    if problem is None:
+        context.cascade_stats["local"] += 1
+        tool_metrics.inc("planner_steps_total", tier="local")
+        print(f"[cascade] ✅ {local_model} plan accepted")
+        return plan
+
+    context.cascade_stats["remote"] += 1
+    tool_metrics.inc("planner_steps_total", tier="remote")
+    print(f"[cascade] ⤴️ Escalating from {local_model}: {problem}")
+    return await generate_plan(
+        perception=perception,
+        memory_items=memory_items,
+        tool_descriptions=tool_descriptions,
+        step_num=step,
+        max_steps=max_steps,
+    )
+
+
+async def explore_all(
+    context: AgentContext,
+    perception: PerceptionResult,
+    memory_items: list[MemoryItem],
+    all_tools: list[Any],
+    tool_index: Optional[ToolIndex] = None,
+) -> str:
+    """
+    Parallel multi-candidate planner.
+    Candidates are (relevant tools), (all tools), then (all tools at each configured
+    temperature); they run concurrently, bounded by `fan_out` and the session deadline.
+    Unfinished candidates are cancelled and the best-scoring plan wins
+    (ties go to the earlier, more conservative candidate).
+    """
+    settings = context.agent_profile.explore_all
+    fan_out = settings.get("fan_out", 3)
+    temperatures = settings.get("temperatures", [0.7, 1.0])
+    step = context.step + 1
+    max_steps = context.agent_profile.max_steps
+
+    hinted = summarize_tools(await select_tools(all_tools, perception, tool_index, timeout=context.remaining()))
+    everything = summarize_tools(all_tools)
+    variants = [(hinted, None), (everything, None)] + [(everything, t) for t in temperatures if t is not None]
+    variants = list(dict.fromkeys(variants))[:fan_out]  # no tool index/hint → hinted == everything
+
+    tasks = [
+        asyncio.create_task(generate_plan(
+            perception=perception,
+            memory_items=memory_items,
+            tool_descriptions=tools,
+            step_num=step,
+            max_steps=max_steps,
+            temperature=temperature,
+        ))
+        for tools, temperature in variants
+    ]
+    done, pending = await asyncio.wait(tasks, timeout=context.remaining())
+    for task in pending:
+        task.cancel()
+    # keep candidate order stable for tie-breaking
+    candidates = [task.result() for task in tasks if task in done and not task.exception()]
+
+    if not candidates:
+        return "FINAL_ANSWER: [unknown]"
+    scored = [(score_plan(plan, context, all_tools), -i, plan) for i, plan in enumerate(candidates)]
+    best_score, _, best = max(scored)
+    print(f"[explore_all] {len(candidates)} candidates, scores {[s for s, _, _ in scored]} → {best}")
+    return best
@@ -0,0 +1,131 @@
+# core/tool_cache.py → Client-side Tool Result Cache
+# Role: Skip re-running deterministic MCP tools for arguments we have already seen.
+
+# Responsibilities:
+
+# Key results by tool name + canonicalised (sorted JSON) arguments
+
+# Per-tool policy: cacheable, ttl (seconds), max_entries (LRU), invalidate_on (files whose change drops the cache;
+#   relative paths resolve against the owning server's directory, where e.g. mcp_server_2.py writes faiss_index/)
+
+# Count hits / misses per tool
+
+# Dependencies:
+
+# config/profiles.yaml (tool_cache section)
+
+# Used by: core/session.py (MultiMCP.call_tool)
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class ToolResultCache:
+    def __init__(self, policies: Dict[str, Any], tool_root: Optional[Callable[[str], Optional[str]]] = None):
+        self.default = policies.get("default", {"cacheable": False})
+        self.policies: Dict[str, Dict[str, Any]] = policies.get("tools", {}) or {}
+        self._entries: Dict[str, OrderedDict] = {}  # tool → OrderedDict[key → (expires, token, result)]
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.tool_root = tool_root  # tool name → owning server's directory (None → process cwd)
+        self._missing_warned: set = set()
+
+    def policy(self, tool_name: str) -> Dict[str, Any]:
+        policy = dict(self.default)
+        if tool_name in self.policies:
+            policy["cacheable"] = True  # listing a tool opts it in unless it says otherwise
+            policy.update(self.policies[tool_name] or {})
+        return policy
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return bool(self.policy(tool_name)["cacheable"])
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Any) -> str:
+        return f"{tool_name}:{json.dumps(arguments, sort_keys=True, default=str)}"
+
+    def _token(self, tool_name: str, policy: Dict[str, Any]) -> Optional[Tuple]:
+        """Version token from the files listed in invalidate_on (mtime + size, cheap to stat)."""
+        paths = policy.get("invalidate_on") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        root = self.tool_root(tool_name) if self.tool_root else None
+        token = []
+        for path in paths:
+            path = os.path.join(root, path) if root else path
+            try:
+                stat = os.stat(path)
+                token.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                if path not in self._missing_warned:
+                    self._missing_warned.add(path)
+                    print(f"[cache] ⚠️ invalidate_on file {path} not found; {tool_name} results won't be invalidated by it")
+                token.append((path, None, None))
+        return tuple(token) or None
+
+    def get(self, tool_name: str, arguments: Any) -> Optional[Any]:
+        policy = self.policy(tool_name)
+        if not policy["cacheable"]:
+            return None
+
+        entries = self._entries.get(tool_name)
+        key = self.make_key(tool_name, arguments)
+        hit = entries.get(key) if entries else None
+        if hit is not None:
+            expires, token, result = hit
+            if (expires is None or expires > time.monotonic()) and token == self._token(tool_name, policy):
+                entries.move_to_end(key)
+                self.hits[tool_name] = self.hits.get(tool_name, 0) + 1
+                return result
+            del entries[key]
+
+        self.misses[tool_name] = self.misses.get(tool_name, 0) + 1
+        return None
+
+    @staticmethod
+    def is_error(result: Any) -> bool:
+        """isError, or a tool that reports failure as text (search_documents → ["ERROR: ..."])."""
+        if getattr(result, "isError", False):
+            return True
+        for item in getattr(result, "content", None) or []:
+            if "ERROR" in (getattr(item, "text", "") or "")[:60]:
+                return True
+        return False
+
+    def put(self, tool_name: str, arguments: Any, result: Any):
+        policy = self.policy(tool_name)
+        if not policy["cacheable"] or self.is_error(result):
+            return
+
+        ttl = policy.get("ttl")
+        expires = time.monotonic() + ttl if ttl else None
+        key = self.make_key(tool_name, arguments)
+        entries = self._entries.setdefault(tool_name, OrderedDict())
+        entries[key] = (expires, self._token(tool_name, policy), result)
+        entries.move_to_end(key)
+
+        max_entries = policy.get("max_entries", 256)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def clear(self, tool_name: Optional[str] = None):
+        if tool_name:
+            self._entries.pop(tool_name, None)
+        else:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        tools = sorted(set(self.hits) | set(self.misses))
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "per_tool": {
+                t: {"hits": self.hits.get(t, 0), "misses": self.misses.get(t, 0)} for t in tools
+            },
+        }
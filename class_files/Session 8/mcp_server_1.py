@@ -269,6 +269,11 @@ if __name__ == "__main__":
     print("mcp_server_1.py starting")
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
             mcp.run()  # Run without transport for dev server
+    elif len(sys.argv) > 1 and sys.argv[1] == "sse":
+        # Shared mode: python mcp_server_1.py sse [port] → many agents connect over localhost
+        mcp.settings.host = "127.0.0.1"
+        mcp.settings.port = int(sys.argv[2]) if len(sys.argv) > 2 else 8001
+        mcp.run(transport="sse")
     else:
         mcp.run(transport="stdio")  # Run with stdio for direct execution
         print("\nShutting down...")
@@ -403,17 +403,28 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
         mcp.run() # Run without transport for dev server
     else:
+        # Shared mode: python mcp_server_2.py sse [port] → many agents share one loaded index
+        transport = "stdio"
+        if len(sys.argv) > 1 and sys.argv[1] == "sse":
+            transport = "sse"
+            mcp.settings.host = "127.0.0.1"
+            mcp.settings.port = int(sys.argv[2]) if len(sys.argv) > 2 else 8002
+
         # Start the server in a separate thread
         import threading
-        server_thread = threading.Thread(target=lambda: mcp.run(transport="stdio"))
+        server_thread = threading.Thread(target=lambda: mcp.run(transport=transport))
         server_thread.daemon = True
         server_thread.start()
         
         # Wait a moment for the server to start
         time.sleep(2)
         
-        # Process documents after server is running
-        process_documents()
+        # Process documents after server is running. WarmPool standbys (CORTEX_MCP_STANDBY=1)
+        # skip it: the primary already indexes, and two writers would corrupt faiss_index/
+        if os.getenv("CORTEX_MCP_STANDBY") == "1":
+            mcp_log("INFO", "Standby instance: skipping document indexing")
+        else:
+            process_documents()
         
         # Keep the main thread alive
         try:
@@ -0,0 +1,158 @@
+# modules/answer_cache.py → Semantic Final-Answer Cache
+# Role: Answer near-duplicate questions ("How much did Anmol Singh pay...", "What did Anmol Singh pay...")
+#       without running perception, planning, search and answering again.
+
+# Responsibilities:
+
+# Embed each query once (same embedding endpoint as memory); the lookup vector is reused by store()
+
+# On lookup return the cached answer of the most similar query above `threshold` (cosine similarity)
+
+# Drop every entry when a file in `invalidate_on` (the FAISS document index) changes
+
+# Only store answers grounded purely in retrieval (`cacheable_tools`): computed answers ("ASCII of INDIA" vs
+# "ASCII of CHINA") embed above the threshold for different operands and must never be replayed
+
+# Count hits / misses; optionally persist to a JSON file
+
+# Used by: core/loop.py (AgentLoop.run)
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from modules.memory import MemoryManager
+
+# Answers that are not worth replaying
+UNCACHEABLE_MARKERS = ["[no result]", "[unknown]", "[partial]", "could not extract"]
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        embedding_url: str,
+        model_name: str = "nomic-embed-text",
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+        invalidate_on: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        invalidate_root: Optional[str] = None,
+        cacheable_tools: Optional[List[str]] = None,
+    ):
+        self.embedder = MemoryManager(embedding_model_url=embedding_url, model_name=model_name)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # relative invalidate_on paths live in the documents server's directory, not our cwd
+        self.invalidate_on = [os.path.join(invalidate_root, p) if invalidate_root else p for p in invalidate_on or []]
+        self._missing_warned: set = set()
+        self.cacheable_tools = set(cacheable_tools or ["search_documents"])
+        self.skipped = 0  # answers not stored because a non-retrieval tool (or none) produced them
+        self.path = Path(path) if path else None
+        self.entries: List[Dict[str, Any]] = []  # {query, answer, created}
+        self.vectors: List[np.ndarray] = []      # unit-normalised embeddings, aligned with entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self.token = self._token()
+        self._load()
+
+    def _token(self) -> List[Any]:
+        token = []
+        for path in self.invalidate_on:
+            try:
+                stat = os.stat(path)
+                token.append([path, stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                if path not in self._missing_warned:
+                    self._missing_warned.add(path)
+                    print(f"[answer-cache] ⚠️ invalidate_on file {path} not found; answers won't be invalidated by it")
+                token.append([path, None, None])
+        return token
+
+    def _check_token(self):
+        token = self._token()
+        if token != self.token:
+            print(f"[answer-cache] Document index changed, dropping {len(self.entries)} cached answers")
+            self.entries, self.vectors = [], []
+            self.token = token
+            self.invalidations += 1
+            self.save()
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Unit-normalised query vector (blocking HTTP); pass it to lookup() and later store()."""
+        vec = self.embedder._get_embedding(text, timeout=timeout)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, query: str, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Best cached entry above the threshold, as {query, answer, similarity}, or None."""
+        with self._lock:
+            self._check_token()
+            if not self.vectors:
+                self.misses += 1
+                return None
+            scores = np.stack(self.vectors) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**self.entries[best], "similarity": round(float(scores[best]), 4)}
+
+    def store(self, query: str, answer: str, vector: np.ndarray, tools_used: List[str]):
+        """
+        Cache an answer under the vector lookup() already used (no second embedding call).
+        Only sessions whose tool calls were all retrieval (cacheable_tools) qualify.
+        """
+        if any(marker in answer for marker in UNCACHEABLE_MARKERS):
+            return
+        if not tools_used or not set(tools_used) <= self.cacheable_tools:
+            self.skipped += 1
+            return
+        with self._lock:
+            self.entries.append({"query": query, "answer": answer, "created": time.time()})
+            self.vectors.append(vector)
+            if len(self.entries) > self.max_entries:
+                self.entries = self.entries[-self.max_entries:]
+                self.vectors = self.vectors[-self.max_entries:]
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+            "skipped": self.skipped,
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({
+            "token": self.token,
+            "entries": [{**e, "vector": v.tolist()} for e, v in zip(self.entries, self.vectors)],
+        }))
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except Exception as e:
+            print(f"[answer-cache] Ignoring unreadable cache {self.path}: {e}")
+            return
+        if data.get("token") != self.token:
+            return  # built against another document index
+        for item in data.get("entries", []):
+            self.vectors.append(np.array(item.pop("vector"), dtype=np.float32))
+            self.entries.append(item)
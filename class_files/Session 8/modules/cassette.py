@@ -0,0 +1,106 @@
+# modules/cassette.py → Record / Replay of LLM and tool traffic
+# Role: Benchmark and profile the agent loop offline and deterministically.
+
+# Responsibilities:
+
+# record: store every ModelManager.generate_text prompt → response, every MultiMCP tool call → result,
+#         every memory embedding and the discovered tool list in a JSON cassette
+# replay: serve them back in the same order without Gemini, Ollama or MCP servers
+
+# Config: `replay:` section in config/profiles.yaml, or env CORTEX_CASSETTE_MODE / CORTEX_CASSETTE
+#   e.g. CORTEX_CASSETTE_MODE=replay python batch.py queries/sample_queries.jsonl out.jsonl
+
+# Used by: modules/model_manager.py, modules/memory.py, core/session.py
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+ROOT = Path(__file__).parent.parent
+PROFILE_YAML = ROOT / "config" / "profiles.yaml"
+
+
+class CassetteMiss(KeyError):
+    """Replay asked for an interaction that was never recorded."""
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "off"):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.interactions: Dict[str, Dict[str, List[Any]]] = {"llm": {}, "tool": {}, "embedding": {}}
+        self.tools: List[Dict[str, Any]] = []
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            data = json.loads(self.path.read_text())
+            self.interactions.update(data.get("interactions", {}))
+            self.tools = data.get("tools", [])
+            print(f"[cassette] Replaying {self.path}")
+        elif mode == "record":
+            atexit.register(self.save)
+            print(f"[cassette] Recording to {self.path}")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def record(self, kind: str, key: str, value: Any):
+        with self._lock:
+            self.interactions[kind].setdefault(key, []).append(value)
+
+    def replay(self, kind: str, key: str) -> Any:
+        """Return recorded values in order; the last one repeats once they run out."""
+        with self._lock:
+            values = self.interactions[kind].get(key)
+            if not values:
+                raise CassetteMiss(f"No recorded {kind} interaction for key {key[:12]}…")
+            served = self._served.get(f"{kind}:{key}", 0)
+            self._served[f"{kind}:{key}"] = served + 1
+            return values[min(served, len(values) - 1)]
+
+    def save(self):
+        if not self.recording:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps({
+                "version": 1,
+                "tools": self.tools,
+                "interactions": self.interactions,
+            }, indent=2, default=str))
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Cassette:
+    """Process-wide cassette, configured from profiles.yaml `replay:` (env vars win)."""
+    global _cassette
+    if _cassette is None:
+        settings = {}
+        if PROFILE_YAML.exists():
+            settings = (yaml.safe_load(PROFILE_YAML.read_text()) or {}).get("replay", {}) or {}
+        _cassette = Cassette(
+            path=os.getenv("CORTEX_CASSETTE", settings.get("cassette", "cache/cassette.json")),
+            mode=os.getenv("CORTEX_CASSETTE_MODE", settings.get("mode", "off")),
+        )
+    return _cassette
@@ -17,6 +17,21 @@ except ImportError:
         print(f"[{now}] [{stage}] {msg}")
 
 model = ModelManager()
+_models = {}  # model_key → ModelManager, for planners that pick a specific model
+
+
+def plan_line_complete(text: str) -> bool:
+    """True once a newline-terminated FUNCTION_CALL:/FINAL_ANSWER: line has streamed in."""
+    finished = text.split("\n")[:-1]
+    return any(line.strip().startswith(("FUNCTION_CALL:", "FINAL_ANSWER:")) for line in finished)
+
+
+def get_model(model_key: Optional[str] = None) -> ModelManager:
+    if model_key is None or model_key == model.text_model_key:
+        return model
+    if model_key not in _models:
+        _models[model_key] = ModelManager(model_key)
+    return _models[model_key]
 
 
 async def generate_plan(
@@ -24,7 +39,9 @@ async def generate_plan(
     memory_items: List[MemoryItem],
     tool_descriptions: Optional[str] = None,
     step_num: int = 1,
-    max_steps: int = 3
+    max_steps: int = 3,
+    temperature: Optional[float] = None,
+    model_key: Optional[str] = None
 ) -> str:
     """Generates the next step plan for the agent: either tool usage or final answer."""
 
@@ -82,7 +99,9 @@ Respond in **exactly one line** using one of the following formats:
 
 
     try:
-        raw = (await model.generate_text(prompt)).strip()
+        raw = (await get_model(model_key).generate_text(
+            prompt, temperature=temperature, stop_when=plan_line_complete, stage="plan"
+        )).strip()
         log("plan", f"LLM output: {raw}")
 
         for line in raw.splitlines():
@@ -27,6 +27,10 @@ from datetime import datetime
 import requests
 import numpy as np
 import faiss
+from modules.cassette import get_cassette
+
+# One pooled HTTP client for embedding calls, shared by every session's MemoryManager
+_http = requests.Session()
 
 
 class MemoryItem(BaseModel):
@@ -47,16 +51,25 @@ class MemoryManager:
         self.data: List[MemoryItem] = []
         self.embeddings: List[np.ndarray] = []
 
-    def _get_embedding(self, text: str) -> np.ndarray:
-        response = requests.post(
+    def _get_embedding(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        cassette = get_cassette()
+        key = cassette.key(self.model_name, text) if cassette.mode != "off" else None
+        if cassette.replaying:
+            return np.array(cassette.replay("embedding", key), dtype=np.float32)
+
+        response = _http.post(
             self.embedding_model_url,
-            json={"model": self.model_name, "prompt": text}
+            json={"model": self.model_name, "prompt": text},
+            timeout=timeout
         )
         response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype=np.float32)
+        embedding = response.json()["embedding"]
+        if cassette.recording:
+            cassette.record("embedding", key, embedding)
+        return np.array(embedding, dtype=np.float32)
 
-    def add(self, item: MemoryItem):
-        embedding = self._get_embedding(item.text)
+    def add(self, item: MemoryItem, timeout: Optional[float] = None):
+        embedding = self._get_embedding(item.text, timeout=timeout)
         self.embeddings.append(embedding)
         self.data.append(item)
 
@@ -71,12 +84,13 @@ class MemoryManager:
         top_k: int = 3,
         type_filter: Optional[str] = None,
         tag_filter: Optional[List[str]] = None,
-        session_filter: Optional[str] = None
+        session_filter: Optional[str] = None,
+        timeout: Optional[float] = None
     ) -> List[MemoryItem]:
         if not self.index or len(self.data) == 0:
             return []
 
-        query_vec = self._get_embedding(query).reshape(1, -1)
+        query_vec = self._get_embedding(query, timeout=timeout).reshape(1, -1)
         D, I = self.index.search(query_vec, top_k * 2)  # overfetch for filtering
 
         results = []
@@ -1,10 +1,19 @@
 import os
 import json
+import time
 import yaml
-import requests
+import sqlite3
+import hashlib
+import asyncio
+import threading
+import httpx
 from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
 from google import genai
+from google.genai import types, errors
 from dotenv import load_dotenv
+from modules.cassette import get_cassette
+from modules.usage import estimate_tokens, record_llm_call
 
 load_dotenv()
 
@@ -12,34 +21,334 @@ ROOT = Path(__file__).parent.parent
 MODELS_JSON = ROOT / "config" / "models.json"
 PROFILE_YAML = ROOT / "config" / "profiles.yaml"
 
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# One pooled AsyncClient for every Ollama call in the process (bound to the loop that created it)
+_ollama_client: Optional[httpx.AsyncClient] = None
+_ollama_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_ollama_client(settings: dict) -> httpx.AsyncClient:
+    global _ollama_client, _ollama_loop
+    loop = asyncio.get_running_loop()
+    if _ollama_client is None or _ollama_client.is_closed or _ollama_loop is not loop:
+        _ollama_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.get("timeout", 60), connect=settings.get("connect_timeout", 5)),
+            limits=httpx.Limits(max_connections=settings.get("max_connections", 20)),
+        )
+        _ollama_loop = loop
+    return _ollama_client
+
+
+async def close_clients():
+    """Close the shared Ollama connection pool (call once on shutdown)."""
+    global _ollama_client
+    if _ollama_client is not None and not _ollama_client.is_closed:
+        await _ollama_client.aclose()
+    _ollama_client = None
+
+
+class LLMResponseCache:
+    """
+    On-disk (SQLite) cache of LLM completions keyed by provider, model, prompt hash and
+    generation parameters. Entries older than `ttl` seconds are misses; past `max_entries`
+    the least recently used rows are evicted. Templated perception/decision prompts repeat
+    byte-for-byte across replays and regression runs, so those skip the provider entirely.
+    get/put block on SQLite (commit = fsync); async callers run them via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, provider TEXT, model TEXT, response TEXT, "
+            "created REAL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, params: dict) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        raw = json.dumps([provider, model, prompt_hash, params], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, provider: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now),
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "size": size,
+        }
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_settings: Optional[dict] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide response cache from profiles.yaml `llm_cache:`; None when disabled or bypassed."""
+    global _llm_cache, _llm_cache_settings
+    if _llm_cache_settings is None:
+        _llm_cache_settings = (yaml.safe_load(PROFILE_YAML.read_text()) or {}).get("llm_cache", {}) or {}
+    bypass = os.getenv("CORTEX_LLM_CACHE_BYPASS", str(_llm_cache_settings.get("bypass", False))).lower()
+    if not _llm_cache_settings.get("enabled") or bypass in ("1", "true", "yes"):
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            path=str(ROOT / _llm_cache_settings.get("path", "cache/llm_cache.sqlite")),
+            max_entries=_llm_cache_settings.get("max_entries", 5000),
+            ttl=_llm_cache_settings.get("ttl"),
+        )
+    return _llm_cache
+
+
+def _gemini_usage(response, usage: Optional[dict]):
+    meta = getattr(response, "usage_metadata", None)
+    if usage is not None and meta is not None and meta.prompt_token_count is not None:
+        usage["prompt_tokens"] = meta.prompt_token_count
+        usage["completion_tokens"] = meta.candidates_token_count or 0
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRY_STATUS
+    if isinstance(e, errors.APIError):
+        return e.code in RETRY_STATUS
+    return False
+
+
 class ModelManager:
-    def __init__(self):
+    def __init__(self, model_key: Optional[str] = None):
         self.config = json.loads(MODELS_JSON.read_text())
         self.profile = yaml.safe_load(PROFILE_YAML.read_text())
 
-        self.text_model_key = self.profile["llm"]["text_generation"]
+        # model_key picks any entry in models.json (e.g. a local Ollama model for the cascade)
+        self.text_model_key = model_key or self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
         self.model_type = self.model_info["type"]
+        self.settings = self.profile["llm"]  # timeout / retries / retry_backoff / max_connections
 
-        # ✅ Gemini initialization (your style)
-        if self.model_type == "gemini":
+        # ✅ Gemini initialization (your style) — not needed when replaying a cassette offline
+        if self.model_type == "gemini" and not get_cassette().replaying:
             api_key = os.getenv("GEMINI_API_KEY")
             self.client = genai.Client(api_key=api_key)
 
-    async def generate_text(self, prompt: str) -> str:
-        if self.model_type == "gemini":
-            return self._gemini_generate(prompt)
+    async def generate_text(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        use_cache: bool = True,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        stage: str = "other",
+    ) -> str:
+        """
+        Full completion text. With `stop_when` (and llm.streaming on) the response is streamed
+        and cut off as soon as stop_when(text_so_far) is true, e.g. once a plan line is complete.
+        `stage` names the caller (perception, plan, ...) in the token/cost accounting.
+        """
+        if not self.settings.get("streaming", True):
+            stop_when = None
+        start = time.perf_counter()
+        cassette = get_cassette()
+        key = cassette.key(self.text_model_key, prompt, temperature) if cassette.mode != "off" else None
+        if cassette.replaying:
+            text = cassette.replay("llm", key)
+            self._record_usage(stage, prompt, text, {}, start, source="cassette")
+            return text
+
+        # Sampled (temperature > 0) calls skip the cache unless llm_cache.cache_sampled is set,
+        # so explore_all's diverse candidates stay diverse
+        cache = get_llm_cache() if use_cache else None
+        if cache and temperature and not _llm_cache_settings.get("cache_sampled", False):
+            cache = None
+        cache_key = None
+        text = None
+        if cache:
+            params = {"temperature": temperature, "early_stop": stop_when is not None}
+            cache_key = cache.make_key(self.model_type, self.model_info["model"], prompt, params)
+            text = await asyncio.to_thread(cache.get, cache_key)
 
-        elif self.model_type == "ollama":
-            return self._ollama_generate(prompt)
+        if text is None:
+            usage = {}
+            text = await self._generate(prompt, temperature, stop_when, usage)
+            self._record_usage(stage, prompt, text, usage, start)
+            if cache:
+                await asyncio.to_thread(cache.put, cache_key, self.model_type, self.model_info["model"], text)
+        else:
+            self._record_usage(stage, prompt, text, {}, start, source="cache")
+        if cassette.recording:
+            cassette.record("llm", key, text)
+        return text
+
+    def _record_usage(self, stage: str, prompt: str, text: str, usage: dict, start: float, source: str = "provider"):
+        """Provider-reported token counts when available (not after an early stream stop), else estimates."""
+        estimated = "prompt_tokens" not in usage
+        prompt_tokens = usage.get("prompt_tokens", estimate_tokens(prompt))
+        completion_tokens = usage.get("completion_tokens", estimate_tokens(text))
+        cost = 0.0
+        if source == "provider":
+            pricing = self.model_info.get("pricing", {})
+            cost = (prompt_tokens * pricing.get("input_per_1m", 0.0)
+                    + completion_tokens * pricing.get("output_per_1m", 0.0)) / 1_000_000
+        record_llm_call(
+            stage=stage,
+            model=self.text_model_key,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            seconds=time.perf_counter() - start,
+            cost=cost,
+            source=source,
+            estimated=estimated,
+        )
+
+    async def _generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        usage: Optional[dict] = None,
+    ) -> str:
+        if self.model_type not in ("gemini", "ollama"):
+            raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+        if stop_when is not None:
+            backend = lambda p, t, u: self._collect_stream(p, t, stop_when, u)
+        elif self.model_type == "gemini":
+            backend = self._gemini_generate
+        else:
+            backend = self._ollama_generate
+
+        # Retry transient failures (timeouts, connection errors, 429/5xx) with exponential backoff
+        retries = self.settings.get("retries", 2)
+        backoff = self.settings.get("retry_backoff", 1.0)
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(backend(prompt, temperature, usage), timeout=self.settings.get("timeout", 60))
+            except Exception as e:
+                if attempt == retries or not _retryable(e):
+                    raise
+                delay = backoff * (2 ** attempt)
+                print(f"[llm] ⚠️ {self.text_model_key} call failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def stream_text(
+        self, prompt: str, temperature: Optional[float] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield response text chunks as the provider produces them (no cache, cassette or retries).
+        `usage` is filled with provider token counts if the stream runs to completion.
+        """
+        stream = self._gemini_stream if self.model_type == "gemini" else self._ollama_stream
+        async for chunk in stream(prompt, temperature, usage):
+            yield chunk
+
+    async def _collect_stream(
+        self, prompt: str, temperature: Optional[float], stop_when: Callable[[str], bool], usage: Optional[dict] = None
+    ) -> str:
+        text = ""
+        stream = self.stream_text(prompt, temperature, usage)
+        try:
+            async for chunk in stream:
+                text += chunk
+                if stop_when(text):
+                    break
+        finally:
+            await stream.aclose()  # closes the HTTP stream, so the provider stops generating
+        return text.strip()
+
+    async def _gemini_stream(
+        self, prompt: str, temperature: Optional[float] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_info["model"],
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=temperature) if temperature is not None else None
+        )
+        async for chunk in stream:
+            _gemini_usage(chunk, usage)  # running totals; the last chunk carries the final counts
+            if chunk.text:
+                yield chunk.text
 
-        raise NotImplementedError(f"Unsupported model type: {self.model_type}")
+    async def _ollama_stream(
+        self, prompt: str, temperature: Optional[float] = None, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        payload = {"model": self.model_info["model"], "prompt": prompt, "stream": True}
+        if temperature is not None:
+            payload["options"] = {"temperature": temperature}
+        async with _get_ollama_client(self.settings).stream(
+            "POST", self.model_info["url"]["generate"], json=payload
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    if usage is not None and "prompt_eval_count" in chunk:
+                        usage["prompt_tokens"] = chunk["prompt_eval_count"]
+                        usage["completion_tokens"] = chunk.get("eval_count", 0)
+                    break
 
-    def _gemini_generate(self, prompt: str) -> str:
-        response = self.client.models.generate_content(
+    async def _gemini_generate(self, prompt: str, temperature: Optional[float] = None, usage: Optional[dict] = None) -> str:
+        response = await self.client.aio.models.generate_content(
             model=self.model_info["model"],
-            contents=prompt
+            contents=prompt,
+            config=types.GenerateContentConfig(temperature=temperature) if temperature is not None else None
         )
+        _gemini_usage(response, usage)
 
         # ✅ Safely extract response text
         try:
@@ -50,10 +359,17 @@ class ModelManager:
             except Exception:
                 return str(response)
 
-    def _ollama_generate(self, prompt: str) -> str:
-        response = requests.post(
+    async def _ollama_generate(self, prompt: str, temperature: Optional[float] = None, usage: Optional[dict] = None) -> str:
+        payload = {"model": self.model_info["model"], "prompt": prompt, "stream": False}
+        if temperature is not None:
+            payload["options"] = {"temperature": temperature}
+        response = await _get_ollama_client(self.settings).post(
             self.model_info["url"]["generate"],
-            json={"model": self.model_info["model"], "prompt": prompt, "stream": False}
+            json=payload
         )
         response.raise_for_status()
-        return response.json()["response"].strip()
+        body = response.json()
+        if usage is not None and "prompt_eval_count" in body:
+            usage["prompt_tokens"] = body["prompt_eval_count"]
+            usage["completion_tokens"] = body.get("eval_count", 0)
+        return body["response"].strip()
@@ -11,6 +11,28 @@ model = ModelManager()
 tool_context = summarize_tools(model.get_all_tools()) if hasattr(model, "get_all_tools") else ""
 
 
+def closed_dict_end(text: str) -> int:
+    """Index just past the first balanced {...} in text (braces inside strings ignored), or -1."""
+    depth, quote, escaped = 0, None, False
+    for i, ch in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'" and depth:
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
 class PerceptionResult(BaseModel):
     user_input: str
     intent: Optional[str]
@@ -43,7 +65,10 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
 """
 
     try:
-        response = await model.generate_text(prompt)
+        # stream, and stop as soon as the dictionary closes
+        response = await model.generate_text(
+            prompt, stop_when=lambda text: closed_dict_end(text) != -1, stage="perception"
+        )
 
         # Clean up raw if wrapped in markdown-style ```json
         raw = response.strip()
@@ -52,6 +77,9 @@ Output only the dictionary on a single line. Do NOT wrap it in ```json or other
 
         # Clean and parse
         clean = re.sub(r"^```json|```$", "", raw, flags=re.MULTILINE).strip()
+        end = closed_dict_end(clean)
+        if end != -1:
+            clean = clean[clean.index("{"):end]
         import json
 
         try:
@@ -1,6 +1,12 @@
 # modules/tools.py
 
 from typing import List, Dict, Optional, Any
+import asyncio
+import hashlib
+import json
+import threading
+import numpy as np
+from modules.memory import MemoryManager
 
 
 def summarize_tools(tools: List[Any]) -> str:
@@ -39,3 +45,115 @@ def tool_expects_input(self, tool_name: str) -> bool:
         return False
     # If the top-level parameter is just 'input', we assume wrapping is required
     return list(tool.parameters.keys()) == ['input']
+
+
+class ToolIndex:
+    """
+    Embedding index over tool name + description + argument schema.
+    Built once after tool discovery; search() returns the top-k tools for a
+    perception (intent, entities, hint) so planning prompts stay small as tools grow.
+    Embeddings are memoised by text, so rebuilding after a catalog change only embeds new tools.
+    """
+
+    def __init__(self, embedding_url: str, model_name: str = "nomic-embed-text", top_k: int = 5):
+        self.embedder = MemoryManager(embedding_model_url=embedding_url, model_name=model_name)
+        self.top_k = top_k
+        self.tools: List[Any] = []
+        self.matrix: Optional[np.ndarray] = None
+        self._vectors: Dict[str, np.ndarray] = {}  # md5(tool text) → unit vector
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tool_text(tool: Any) -> str:
+        schema = getattr(tool, "inputSchema", None) or {}
+        return (
+            f"{tool.name}: {getattr(tool, 'description', '') or ''}\n"
+            f"args: {json.dumps(schema.get('properties', {}), sort_keys=True)}"
+        )
+
+    def _embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        vec = self.embedder._get_embedding(text, timeout=timeout)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def build(self, tools: List[Any]):
+        vectors = []
+        for tool in tools:
+            key = hashlib.md5(self.tool_text(tool).encode("utf-8")).hexdigest()
+            if key not in self._vectors:
+                self._vectors[key] = self._embed(self.tool_text(tool))
+            vectors.append(self._vectors[key])
+        with self._lock:
+            self.tools = list(tools)
+            self.matrix = np.stack(vectors) if vectors else None
+
+    def search(self, text: str, top_k: Optional[int] = None, timeout: Optional[float] = None) -> List[Any]:
+        """Blocking (HTTP embedding of `text`); call it from a worker thread."""
+        with self._lock:
+            tools, matrix = self.tools, self.matrix
+        if matrix is None or not text.strip():
+            return tools
+        scores = matrix @ self._embed(text, timeout=timeout)
+        order = np.argsort(-scores)[: top_k or self.top_k]
+        return [tools[i] for i in order]
+
+
+async def select_tools(
+    tools: List[Any],
+    perception: Any,
+    tool_index: Optional[ToolIndex] = None,
+    timeout: Optional[float] = None,
+) -> List[Any]:
+    """
+    Tools to show the planner for this perception.
+    With a ToolIndex: an exact tool_hint match first, then the nearest tools to
+    intent + entities + hint. Without one (or if embedding fails / times out): filter_tools_by_hint.
+    The query embedding runs in a worker thread, bounded by `timeout` (the session's remaining budget).
+    """
+    hint = perception.tool_hint
+    if tool_index is None:
+        return filter_tools_by_hint(tools, hint=hint)
+
+    query = " ".join(filter(None, [perception.intent, ", ".join(perception.entities), hint]))
+    try:
+        nearest = await asyncio.to_thread(tool_index.search, query, timeout=timeout)
+    except Exception as e:
+        print(f"[tools] ⚠️ Tool retrieval failed, falling back to hint filter: {e}")
+        return filter_tools_by_hint(tools, hint=hint)
+
+    available = {tool.name for tool in tools}
+    exact = [tool for tool in tools if hint and tool.name == hint]
+    return exact + [tool for tool in nearest if tool.name in available and tool not in exact]
+
+
+def validate_arguments(args: Dict[str, Any], schema: Dict[str, Any]) -> List[str]:
+    """
+    Light JSON-schema check of parsed FUNCTION_CALL arguments: required keys, unknown keys
+    and basic types, following $ref into $defs (FastMCP wraps inputs in pydantic models).
+    Returns a list of problems; empty means the arguments look valid.
+    """
+    defs = schema.get("$defs", {})
+    types = {"string": str, "integer": int, "number": (int, float), "boolean": bool,
+             "array": (list, tuple), "object": dict}
+
+    def resolve(node: Dict[str, Any]) -> Dict[str, Any]:
+        while "$ref" in node:
+            node = defs.get(node["$ref"].split("/")[-1], {})
+        return node
+
+    def check(value: Any, node: Dict[str, Any], path: str) -> List[str]:
+        node = resolve(node)
+        expected = types.get(node.get("type"))
+        if expected and not isinstance(value, expected):
+            return [f"{path}: expected {node['type']}, got {type(value).__name__}"]
+        if not isinstance(value, dict) or "properties" not in node:
+            return []
+        problems = [f"{path}.{key}: missing" for key in node.get("required", []) if key not in value]
+        for key, item in value.items():
+            if key not in node["properties"]:
+                problems.append(f"{path}.{key}: unknown argument")
+            else:
+                problems.extend(check(item, node["properties"][key], f"{path}.{key}"))
+        return problems
+
+    return [p.lstrip(".") for p in check(args, schema, "")]
@@ -0,0 +1,127 @@
+# modules/usage.py → LLM Token, Latency and Cost Accounting
+# Role: Show where the tokens go (perception vs. planning), what a session costs, and which prompts bloat.
+
+# Responsibilities:
+
+# Every ModelManager.generate_text call records model, caller stage, prompt/completion tokens
+# (provider-reported, or estimated at ~4 chars/token), latency, cost and source (provider/cache/cassette)
+
+# Roll calls up per session (AgentContext.llm_usage, bound via contextvars by AgentLoop.run)
+# and process-wide (usage_ledger), and export llm_* series through core/metrics.tool_metrics
+
+# Pricing: `pricing: {input_per_1m, output_per_1m}` (USD) per model in config/models.json
+
+# Used by: modules/model_manager.py, core/loop.py, core/context.py, agent.py, batch.py, service.py
+
+import contextvars
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from core.metrics import tool_metrics
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for providers that do not report usage (~4 characters per token)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class UsageLedger:
+    """Aggregated LLM usage keyed by (stage, model); thread-safe and bounded in size."""
+
+    def __init__(self):
+        self.totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        seconds: float,
+        cost: float,
+        source: str = "provider",
+        estimated: bool = False,
+    ):
+        with self._lock:
+            row = self.totals.setdefault((stage, model), {
+                "calls": 0, "cached_calls": 0, "estimated_calls": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0, "cost_usd": 0.0,
+            })
+            row["calls"] += 1
+            row["cached_calls"] += source != "provider"
+            row["estimated_calls"] += estimated
+            row["prompt_tokens"] += prompt_tokens
+            row["completion_tokens"] += completion_tokens
+            row["seconds"] += seconds
+            row["cost_usd"] += cost
+
+    def summary(self) -> Dict:
+        with self._lock:
+            rows = [{"stage": stage, "model": model, **dict(row)} for (stage, model), row in sorted(self.totals.items())]
+        for row in rows:
+            row["seconds"] = round(row["seconds"], 3)
+            row["cost_usd"] = round(row["cost_usd"], 6)
+            row["avg_prompt_tokens"] = round(row["prompt_tokens"] / row["calls"]) if row["calls"] else 0
+        return {
+            "calls": sum(r["calls"] for r in rows),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+            "completion_tokens": sum(r["completion_tokens"] for r in rows),
+            "cost_usd": round(sum(r["cost_usd"] for r in rows), 6),
+            "by_stage_model": rows,
+        }
+
+    def report(self, title: str = "LLM usage") -> str:
+        summary = self.summary()
+        lines = [
+            f"[usage] {title}: {summary['calls']} call(s), {summary['prompt_tokens']} prompt + "
+            f"{summary['completion_tokens']} completion tokens, ${summary['cost_usd']:.4f}"
+        ]
+        for row in summary["by_stage_model"]:
+            lines.append(
+                f"[usage]   {row['stage']:<12} {row['model']:<20} {row['calls']:>4} call(s) "
+                f"avg prompt {row['avg_prompt_tokens']:>6} tok, completion {row['completion_tokens']:>6} tok, "
+                f"{row['seconds']:.2f}s, ${row['cost_usd']:.4f}"
+                + (f" ({row['cached_calls']} cached)" if row["cached_calls"] else "")
+            )
+        return "\n".join(lines)
+
+
+# Process-wide totals across every session
+usage_ledger = UsageLedger()
+
+# Session ledger for the current task tree (set by AgentLoop.run; copied into gather/create_task/to_thread)
+_session_usage: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar("session_usage", default=None)
+
+
+def bind_session_usage(ledger: UsageLedger) -> contextvars.Token:
+    return _session_usage.set(ledger)
+
+
+def unbind_session_usage(token: contextvars.Token):
+    _session_usage.reset(token)
+
+
+def record_llm_call(
+    stage: str,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    seconds: float,
+    cost: float = 0.0,
+    source: str = "provider",
+    estimated: bool = False,
+):
+    ledgers: List[UsageLedger] = [usage_ledger]
+    session = _session_usage.get()
+    if session is not None:
+        ledgers.append(session)
+    for ledger in ledgers:
+        ledger.record(stage, model, prompt_tokens, completion_tokens, seconds, cost, source, estimated)
+
+    tool_metrics.observe("llm_call_seconds", seconds, model=model, stage=stage, source=source)
+    tool_metrics.inc("llm_tokens_total", prompt_tokens, model=model, stage=stage, kind="prompt")
+    tool_metrics.inc("llm_tokens_total", completion_tokens, model=model, stage=stage, kind="completion")
+    if cost:
+        tool_metrics.inc("llm_cost_usd_total", cost, model=model, stage=stage)
@@ -0,0 +1,198 @@
+# service.py → Multi-tenant Cortex-R service
+# Role: Long-running process that answers many queries concurrently.
+
+# Responsibilities:
+
+# One shared MultiMCP (server sessions, caches, supervisor), one AgentProfile and the module-level model clients
+
+# A fresh, isolated AgentContext per query (AgentLoop)
+
+# Bounded worker pool + bounded queue: when the queue is full new requests get 503 (backpressure)
+
+# Local HTTP endpoint:
+#   POST /query   {"query": "..."} → {"session_id", "answer", "seconds"}
+#   GET  /health  → workers, queue depth, MCP server status
+
+# Usage: python service.py   (settings under `service:` in config/profiles.yaml)
+
+import asyncio
+import contextlib
+import time
+from typing import Any, Dict, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from agent import build_answer_cache, build_multi_mcp, load_profile, log
+from core.context import AgentProfile
+from core.loop import AgentLoop
+from core.session import MultiMCP
+from modules.answer_cache import SemanticAnswerCache
+from modules.model_manager import close_clients, get_llm_cache
+from modules.usage import usage_ledger
+
+
+class AgentService:
+    def __init__(
+        self,
+        multi_mcp: MultiMCP,
+        profile: Optional[AgentProfile] = None,
+        max_concurrency: int = 4,
+        queue_size: int = 32,
+        request_timeout: float = 300.0,
+        response_grace: float = 5.0,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+    ):
+        self.mcp = multi_mcp
+        self.answer_cache = answer_cache
+        self.profile = profile or AgentProfile()
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout  # per request, queue wait included
+        self.response_grace = response_grace    # extra time for the session to return a [partial] answer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers: list = []
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self):
+        await self.mcp.initialize()
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_concurrency)]
+        log("service", f"Ready: {self.max_concurrency} workers, queue size {self.queue.maxsize}")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        await self.mcp.shutdown()
+        await close_clients()
+
+    def submit(self, query: str) -> asyncio.Future:
+        """Queue a query; raises asyncio.QueueFull when the service is saturated."""
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + self.request_timeout
+        try:
+            self.queue.put_nowait((query, future, deadline))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        return future
+
+    async def _worker(self, worker_id: int):
+        while True:
+            query, future, deadline = await self.queue.get()
+            remaining = deadline - time.monotonic()
+            if future.cancelled() or remaining <= 0:  # client gave up / timed out while queued
+                self.queue.task_done()
+                continue
+            self.active += 1
+            try:
+                result = await self.run_query(query, time_budget=remaining)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.active -= 1
+                self.queue.task_done()
+
+    async def run_query(self, query: str, time_budget: Optional[float] = None) -> Dict[str, Any]:
+        """Run one query in its own AgentLoop/AgentContext on the shared MultiMCP."""
+        agent = AgentLoop(
+            user_input=query,
+            dispatcher=self.mcp,
+            profile=self.profile,
+            time_budget=time_budget if time_budget is not None else self.request_timeout,
+            answer_cache=self.answer_cache,
+        )
+        start = time.perf_counter()
+        answer = await agent.run()
+        self.completed += 1
+        return {
+            "session_id": agent.context.session_id,
+            "answer": answer.replace("FINAL_ANSWER:", "").strip(),
+            "steps": len(agent.context.stage_timings),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self.workers),
+            "active": self.active,
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "mcp_servers": self.mcp.server_status(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "llm_cache": get_llm_cache().stats() if get_llm_cache() else None,
+            "llm_usage": usage_ledger.summary(),
+        }
+
+
+def build_app(service: AgentService) -> Starlette:
+    async def query(request: Request) -> JSONResponse:
+        try:
+            body = await request.json()
+            text = body["query"].strip()
+        except Exception:
+            return JSONResponse({"error": "expected JSON body {\"query\": \"...\"}"}, status_code=400)
+        try:
+            future = service.submit(text)
+        except asyncio.QueueFull:
+            return JSONResponse(
+                {"error": "service busy, try again later"}, status_code=503, headers={"Retry-After": "5"}
+            )
+        try:
+            # the session budget ends at request_timeout; grace lets it return its [partial] answer
+            return JSONResponse(
+                await asyncio.wait_for(future, service.request_timeout + service.response_grace)
+            )
+        except asyncio.TimeoutError:
+            return JSONResponse({"error": "query timed out"}, status_code=504)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    async def health(request: Request) -> JSONResponse:
+        return JSONResponse(service.health())
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        yield
+        await service.stop()
+
+    return Starlette(
+        routes=[Route("/query", query, methods=["POST"]), Route("/health", health, methods=["GET"])],
+        lifespan=lifespan,
+    )
+
+
+def main():
+    profile = load_profile()
+    settings = profile.get("service", {})
+    service = AgentService(
+        multi_mcp=build_multi_mcp(profile),
+        max_concurrency=settings.get("max_concurrency", 4),
+        queue_size=settings.get("queue_size", 32),
+        request_timeout=settings.get("request_timeout", 300.0),
+        response_grace=settings.get("response_grace", 5.0),
+        answer_cache=build_answer_cache(profile),
+    )
+    uvicorn.run(
+        build_app(service),
+        host=settings.get("host", "127.0.0.1"),
+        port=settings.get("port", 8080),
+    )
+
+
+if __name__ == "__main__":
+    main()